@@ -0,0 +1,99 @@
+"""Compare per-word redaction against batched per-page redaction.
+
+Run from the repository root:
+
+    python benchmarks/bench_redaction.py [--repeat N] [--lines N]
+
+The sample PDFs in data/input are processed with both strategies and the
+resulting pages are checked for identical text and rendering. A synthetic
+invoice with many price lines is included as a larger input; how much the
+batching saves there depends on how many words each page redacts.
+"""
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pdf_processor.processor import PDFProcessor  # noqa: E402
+from synthetic import make_invoice  # noqa: E402
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_DIR = os.path.join(BASE_DIR, 'data', 'input')
+
+
+def make_processor():
+    """Create a processor without touching any input or output directory."""
+    return PDFProcessor(input_dir=None, output_dir=None, cleanup_on_init=False)
+
+
+def legacy_redact(processor, input_path, output_path):
+    """The original strategy: apply redactions once per matched word."""
+    pdf_document = fitz.open(input_path)
+    for page in pdf_document:
+        rects = processor._collect_redaction_rects(page.get_text("words"))
+        for rect in rects or []:
+            page.add_redact_annot(fitz.Rect(rect))
+            page.apply_redactions()
+    pdf_document.save(output_path)
+    pdf_document.close()
+
+
+def page_digests(path):
+    with fitz.open(path) as pdf_document:
+        return [
+            (page.get_text(), hashlib.md5(page.get_pixmap(dpi=72).samples).hexdigest())
+            for page in pdf_document
+        ]
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='runs per file, best time is reported')
+    parser.add_argument('--lines', type=int, default=300, help='price lines in the synthetic invoice')
+    args = parser.parse_args()
+
+    processor = make_processor()
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs = sorted(glob.glob(os.path.join(SAMPLE_DIR, '*.pdf')))
+        synthetic = os.path.join(tmp, f'synthetic_{args.lines}.pdf')
+        make_invoice(synthetic, pages=max(1, args.lines // 50), lines_per_page=min(args.lines, 50))
+        inputs.append(synthetic)
+
+        print(f"{'file':<32} {'legacy':>10} {'batched':>10} {'speedup':>8}  output")
+        all_identical = True
+        for input_path in inputs:
+            name = os.path.basename(input_path)
+            legacy_out = os.path.join(tmp, f'legacy_{name}')
+            batched_out = os.path.join(tmp, f'batched_{name}')
+
+            legacy_time = timed(lambda: legacy_redact(processor, input_path, legacy_out), args.repeat)
+            batched_time = timed(lambda: processor.process_single_file(input_path, batched_out), args.repeat)
+
+            identical = page_digests(legacy_out) == page_digests(batched_out)
+            all_identical = all_identical and identical
+            print(f"{name:<32} {legacy_time * 1000:>8.1f}ms {batched_time * 1000:>8.1f}ms "
+                  f"{legacy_time / batched_time:>7.1f}x  {'identical' if identical else 'DIFFERENT'}")
+
+    return 0 if all_identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""Benchmark suite and regression check for the redaction pipeline.
+
+Run from the repository root:
+
+    python benchmarks/run_suite.py                  # benchmark and compare with the golden files
+    python benchmarks/run_suite.py --quick          # smaller synthetic documents
+    python benchmarks/run_suite.py --update-golden  # accept the current output as the new baseline
+    python benchmarks/run_suite.py --split-pages 1  # process page ranges on their own and join them
+
+The corpus is the sample PDFs in data/input plus synthetic invoices from
+benchmarks/synthetic.py. Every document is processed in a fresh process so
+that peak memory is measured per document. The report shows wall time,
+pages/s, peak RSS, the pages triage skipped and how the time splits over
+opening, text extraction, triage, section detection, redaction and saving.
+
+The golden files in benchmarks/golden record, per page, the redacted
+rectangles and a hash of the text left in the output, and for the whole
+document whether its metadata was kept and how many outline entries are
+left. The check fails if an optimization changes any of these.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+SAMPLE_DIR = os.path.join(BASE_DIR, 'data', 'input')
+GOLDEN_DIR = os.path.join(BENCH_DIR, 'golden')
+STAGES = ('open', 'extract', 'triage', 'detect', 'redact', 'save')
+
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+# name -> make_invoice arguments; the quick variants keep the same layout with fewer pages
+SYNTHETIC = {
+    'synthetic_invoice_40_lines': (dict(pages=1, lines_per_page=40), dict(pages=1, lines_per_page=40)),
+    'synthetic_offer_200_pages': (
+        dict(pages=200, lines_per_page=50, terms_pages=40),
+        dict(pages=20, lines_per_page=50, terms_pages=4),
+    ),
+    'synthetic_continuation_pages': (
+        dict(pages=8, lines_per_page=50, terms_pages=2, header_pages=1),
+        dict(pages=3, lines_per_page=50, terms_pages=1, header_pages=1),
+    ),
+    # A4 header page, A3 header page, A4 continuation page: the last page needs the A4 columns
+    'synthetic_mixed_sizes': (
+        dict(pages=3, lines_per_page=40, header_pages=2, papers=('a4', 'a3')),
+        dict(pages=3, lines_per_page=40, header_pages=2, papers=('a4', 'a3')),
+    ),
+}
+
+
+def build_corpus(tmp, quick):
+    """Return (name, path, full_golden) for every document in the corpus."""
+    from synthetic import make_invoice
+
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(SAMPLE_DIR, '*.pdf'))):
+        corpus.append((os.path.splitext(os.path.basename(path))[0], path, True))
+    for name, (full, small) in SYNTHETIC.items():
+        if quick:
+            name = f'{name}_quick'
+        path = os.path.join(tmp, f'{name}.pdf')
+        make_invoice(path, **(small if quick else full))
+        corpus.append((name, path, False))
+    return corpus
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def snapshot(processor, input_path, output_path, full):
+    """Per-page redacted rectangles and remaining text of a processed document."""
+    import fitz  # PyMuPDF
+
+    redactions = {page['page']: page['rects'] for page in processor.find_redactions(input_path)}
+    pages = []
+    with fitz.open(output_path) as pdf_document:
+        for page in pdf_document:
+            rects = [[round(value, 2) for value in rect] for rect in redactions.get(page.number + 1, [])]
+            entry = {
+                'page': page.number + 1,
+                'redactions': len(rects),
+                'rects_sha256': hashlib.sha256(json.dumps(rects).encode('utf-8')).hexdigest(),
+                'text_sha256': hashlib.sha256(page.get_text().encode('utf-8')).hexdigest(),
+            }
+            if full:
+                entry['rects'] = rects
+            pages.append(entry)
+    return pages
+
+
+def document_snapshot(input_path, output_path):
+    """Whether the output kept the metadata of the input, and the outline entries left in it."""
+    import fitz  # PyMuPDF
+
+    with fitz.open(input_path) as source, fitz.open(output_path) as output:
+        metadata = {key: value for key, value in source.metadata.items() if key != 'format'}
+        return {
+            'metadata_kept': all(output.metadata.get(key) == value for key, value in metadata.items()),
+            'outline': len(output.get_toc()),
+        }
+
+
+def process_split(processor, input_path, output_path, split_pages):
+    """Process the page ranges of split_pages pages one by one and join them, like a split batch does."""
+    import fitz  # PyMuPDF
+    from pdf_processor.parallel import assemble_parts, page_ranges
+
+    with fitz.open(input_path) as pdf_document:
+        page_count = pdf_document.page_count
+    part_paths = []
+    for start, stop in page_ranges(page_count, split_pages):
+        part_paths.append(f'{output_path}.{start:06d}.part')
+        processor.process_page_range(input_path, part_paths[-1], start, stop)
+    assemble_parts(part_paths, output_path, source_path=input_path)
+    for part_path in part_paths:
+        os.remove(part_path)
+    return page_count
+
+
+def run_one(input_path, output_path, full, window_pages, split_pages, conn):
+    """Process one document in this (fresh) process and send the measurements back."""
+    import logging
+    logging.disable(logging.WARNING)
+    from pdf_processor.processor import PDFProcessor
+
+    processor = PDFProcessor(input_dir=None, output_dir=None, cleanup_on_init=False, window_pages=window_pages)
+    start = time.perf_counter()
+    if split_pages:
+        pages = process_split(processor, input_path, output_path, split_pages)
+    else:
+        pages = processor.process_single_file(input_path, output_path)
+    wall = time.perf_counter() - start
+    conn.send({
+        'pages': pages,
+        'skipped': processor.pages_skipped,
+        'wall': wall,
+        'peak_mb': peak_rss_mb(),
+        'stages': dict(processor.stage_times),
+        'golden': snapshot(processor, input_path, output_path, full),
+        'document': document_snapshot(input_path, output_path),
+    })
+    conn.close()
+
+
+def measure(input_path, output_path, full, window_pages=None, split_pages=None):
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=run_one, args=(input_path, output_path, full, window_pages, split_pages, child))
+    process.start()
+    child.close()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+def compare_golden(name, pages, document):
+    """Return a list of differences between pages and document and the stored golden file."""
+    path = os.path.join(GOLDEN_DIR, f'{name}.json')
+    if not os.path.exists(path):
+        return [f'no golden file {os.path.relpath(path, BASE_DIR)} (run with --update-golden)']
+    with open(path, encoding='utf-8') as f:
+        stored = json.load(f)
+    golden = stored['pages']
+
+    if len(golden) != len(pages):
+        return [f'{len(pages)} pages, golden has {len(golden)}']
+    differences = []
+    if stored.get('document') != document:
+        differences.append(f"document: {document}, golden has {stored.get('document')}")
+    for expected, actual in zip(golden, pages):
+        if expected['rects_sha256'] != actual['rects_sha256']:
+            detail = f"{actual['redactions']} redactions, golden has {expected['redactions']}"
+            if 'rects' in expected and 'rects' in actual:
+                missing = [rect for rect in expected['rects'] if rect not in actual['rects']]
+                extra = [rect for rect in actual['rects'] if rect not in expected['rects']]
+                detail += f'; missing {missing[:5]}, extra {extra[:5]}'
+            differences.append(f"page {actual['page']}: {detail}")
+        if expected['text_sha256'] != actual['text_sha256']:
+            differences.append(f"page {actual['page']}: remaining text differs")
+    return differences
+
+
+def write_golden(name, pages, document):
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    with open(os.path.join(GOLDEN_DIR, f'{name}.json'), 'w', encoding='utf-8') as f:
+        json.dump({'file': name, 'document': document, 'pages': pages}, f, indent=1)
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='use smaller synthetic documents')
+    parser.add_argument('--update-golden', action='store_true', help='write the current output as golden files')
+    parser.add_argument('--window-pages', type=int, help='process documents in windows of this many pages')
+    parser.add_argument('--split-pages', type=int, help='process page ranges of this many pages on their own')
+    parser.add_argument('--only', help='only run documents whose name contains this text')
+    args = parser.parse_args()
+
+    failures = 0
+    totals = {'pages': 0, 'wall': 0.0}
+    header = f"{'document':<36} {'pages':>5} {'skip':>5} {'wall':>9} {'pages/s':>8} {'peak':>8}  " + \
+        ' '.join(f'{stage:>7}' for stage in STAGES) + '  golden'
+    print(header)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, input_path, full in build_corpus(tmp, args.quick):
+            if args.only and args.only not in name:
+                continue
+            result = measure(input_path, os.path.join(tmp, f'out_{name}.pdf'), full, args.window_pages,
+                             args.split_pages)
+            totals['pages'] += result['pages']
+            totals['wall'] += result['wall']
+
+            if args.update_golden:
+                write_golden(name, result['golden'], result['document'])
+                status = 'updated'
+            else:
+                differences = compare_golden(name, result['golden'], result['document'])
+                status = 'ok' if not differences else 'DIFFERENT'
+                failures += bool(differences)
+
+            stages = ' '.join(
+                f"{100 * result['stages'].get(stage, 0.0) / result['wall']:>6.1f}%" for stage in STAGES
+            )
+            print(f"{name:<36} {result['pages']:>5} {result['skipped']:>5} {result['wall'] * 1000:>7.1f}ms "
+                  f"{result['pages'] / result['wall']:>8.1f} {result['peak_mb']:>6.1f}MB  {stages}  {status}")
+            if not args.update_golden:
+                for difference in differences:
+                    print(f'    {difference}')
+
+    if totals['wall']:
+        print(f"total: {totals['pages']} pages in {totals['wall']:.2f}s "
+              f"({totals['pages'] / totals['wall']:.1f} pages/s)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Deterministic synthetic invoices for the benchmarks.
+
+The layout mimics the sample offers: a Pris/Total header row, price lines
+with "1 234,-" style amounts, an occasional kampanje line, an MVA summary
+on the last invoice page and optional terms pages without any prices.
+Continuation pages without a header row can be made with header_pages and
+pages of different sizes with papers.
+"""
+import fitz  # PyMuPDF
+
+TERMS = (
+    "Leveringsbetingelser: Varene leveres fritt lager. Reklamasjon må skje innen 14 dager "
+    "etter mottak. Tilbudet er gyldig i 30 dager fra tilbudsdato."
+)
+
+
+def format_amount(value):
+    return f"{value:,}".replace(",", " ") + ",-"
+
+
+def make_invoice(path, pages=5, lines_per_page=50, kampanje_every=25, terms_pages=0, header_pages=None,
+                 papers=('a4',)):
+    """Write an invoice with pages * lines_per_page price lines to path.
+
+    Only the first header_pages pages get the header row (default: all).
+    The invoice pages cycle through the paper sizes in papers.
+
+    All text of a page goes through one TextWriter, so each page gets a
+    single content stream like the generated offers do.
+    """
+    pdf_document = fitz.open()
+    font = fitz.Font("helv")
+    line = 0
+    for page_number in range(pages):
+        paper = fitz.paper_rect(papers[page_number % len(papers)])
+        page = pdf_document.new_page(width=paper.width, height=paper.height)
+        writer = fitz.TextWriter(page.rect)
+
+        def text(x, y, value, fontsize=8):
+            writer.append((x, y), value, font=font, fontsize=fontsize)
+
+        if header_pages is None or page_number < header_pages:
+            text(50, 60, "Beskrivelse", 9)
+            text(300, 60, "Antall", 9)
+            text(400, 60, "Pris", 9)
+            text(500, 60, "Total", 9)
+
+        y = 80
+        for _ in range(lines_per_page):
+            price = 100 + (line * 37) % 9000
+            count = 1 + line % 7
+            text(50, y, f"Vindu type {line % 12} nr {line}")
+            text(300, y, str(count))
+            text(400, y, format_amount(price))
+            text(500, y, format_amount(price * count))
+            y += 13
+            line += 1
+            if kampanje_every and line % kampanje_every == 0:
+                text(50, y, "Kampanje")
+                text(120, y, f"-{price // 4},- 20% på vinduer")
+                y += 13
+
+        if page_number == pages - 1:
+            y += 10
+            text(50, y, "Herav mva 25%: 12 345,67")
+            text(50, y + 13, "Totalbeløp uten mva: 49 382,68")
+            text(50, y + 26, "Gjennomsnittlig uverdi for hele ordren er 1,08.")
+
+        writer.write_text(page)
+
+    for _ in range(terms_pages):
+        page = pdf_document.new_page()
+        page.insert_textbox(fitz.Rect(50, 60, 545, 800), (TERMS + " ") * 12, fontsize=9)
+
+    pdf_document.save(path)
+    pdf_document.close()
@@ -0,0 +1,29 @@
+"""Production server settings: gunicorn -c gunicorn.conf.py main:app
+
+The app is imported once in the master process (preload_app), so PyMuPDF
+and the Flask app are loaded before the workers are forked. Each worker
+then warms up on its own thread; /readyz answers 503 until that is done.
+
+Jobs live in the memory of the worker that started them, so with more than
+one worker the load balancer must send a session to the same worker
+(sticky sessions) or /jobs/<id> can answer 404. The default is therefore a
+single worker with threads, and CPU parallelism comes from PDF_WORKERS:
+PyMuPDF does not run in parallel on the threads of one process.
+"""
+import os
+import threading
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5002)}"
+workers = int(os.environ.get('WEB_WORKERS', 1))
+threads = int(os.environ.get('WEB_THREADS', 8))
+worker_class = 'gthread'
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+preload_app = True
+accesslog = '-'
+
+
+def post_worker_init(worker):
+    import main
+    threading.Thread(target=main.warm_up, name='warm-up', daemon=True).start()
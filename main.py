@@ -1,11 +1,25 @@
-from flask import Flask, render_template, request, send_file, jsonify
+from flask import Flask, Response, g, render_template, request, send_file, jsonify, stream_with_context, url_for
+import io
 import os
+import threading
+from functools import wraps
+import fitz  # PyMuPDF
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from pdf_processor.processor import PDFProcessor
+from pdf_processor.jobs import JobManager
+from pdf_processor.cache import ResultCache, rules_version
+from pdf_processor.streaming import UploadTooLarge, iter_zip, read_stream, save_stream
+from pdf_processor.workspace import WorkspaceManager
+from pdf_processor.metrics import REGISTRY, span
+from pdf_processor.previews import FORMATS, PageNotFound, PreviewBusy, PreviewCache
+from pdf_processor.admission import AdmissionLimit
+from pdf_processor.redaction import redact_page
+from pdf_processor.parallel import shared_pool
 import logging
 from werkzeug.middleware.proxy_fix import ProxyFix
-import zipfile
-import io
+import json
+import time
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -35,20 +49,183 @@ def add_security_headers(response):
     response.headers['Content-Security-Policy'] = "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline';"
     return response
 
-app.config['UPLOAD_FOLDER'] = os.path.join(DATA_DIR, 'input')
-app.config['OUTPUT_FOLDER'] = os.path.join(DATA_DIR, 'output')
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Keep the session's workspace cookie alive as long as the workspace is
+@app.after_request
+def set_workspace_cookie(response):
+    if g.get('workspace_id'):
+        response.set_cookie(
+            WORKSPACE_COOKIE, g.workspace_id,
+            max_age=app.config['WORKSPACE_TTL'], httponly=True, samesite='Lax', secure=request.is_secure
+        )
+    return response
+
+WORKSPACE_COOKIE = 'workspace'
+app.config['WORKSPACE_FOLDER'] = os.environ.get('WORKSPACE_DIR', os.path.join(DATA_DIR, 'workspaces'))
+app.config['WORKSPACE_TTL'] = int(os.environ.get('WORKSPACE_TTL', 3600))  # Seconds before an idle workspace is removed
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 512)) * 1024 * 1024  # Max request size
+app.config['MAX_REDACT_LENGTH'] = int(os.environ.get('MAX_REDACT_MB', 50)) * 1024 * 1024  # /redact holds it in memory
+app.config['ZIP_STORE_PDFS'] = os.environ.get('ZIP_STORE_PDFS', '1') != '0'  # Add PDFs to ZIP downloads uncompressed
+app.config['PDF_WORKERS'] = int(os.environ.get('PDF_WORKERS', 1))  # Worker processes, 1 = serial
+app.config['PDF_SPLIT_PAGES'] = int(os.environ.get('PDF_SPLIT_PAGES', 0)) or None  # Split larger documents by page range
+app.config['PDF_WINDOW_PAGES'] = int(os.environ.get('PDF_WINDOW_PAGES', 0)) or None  # Larger documents go in page windows
+app.config['PDF_MEMORY_LIMIT_MB'] = int(os.environ.get('PDF_MEMORY_LIMIT_MB', 0))  # Flush a window early above this RSS
+# PyMuPDF does not run in parallel on threads, so without worker processes one job runs at a time
+DEFAULT_JOB_WORKERS = 1 if app.config['PDF_WORKERS'] == 1 else min(4, os.cpu_count() or 1)
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', DEFAULT_JOB_WORKERS))  # Jobs running at the same time
+app.config['CACHE_FOLDER'] = os.environ.get('RESULT_CACHE_DIR', os.path.join(DATA_DIR, 'cache'))
+app.config['CACHE_MAX_MB'] = int(os.environ.get('RESULT_CACHE_MB', 512))  # 0 disables the result cache
+app.config['PDF_SAVE_OPTIONS'] = {  # Document.save options: more CPU for smaller output files
+    'garbage': int(os.environ.get('PDF_SAVE_GARBAGE', 0)),
+    'deflate': os.environ.get('PDF_SAVE_DEFLATE', '0') != '0'
+}
+app.config['PREVIEW_FOLDER'] = os.environ.get('PREVIEW_CACHE_DIR', os.path.join(DATA_DIR, 'previews'))
+app.config['PREVIEW_CACHE_MB'] = int(os.environ.get('PREVIEW_CACHE_MB', 64))  # Size of the rendered page cache
+app.config['PREVIEW_DPI'] = int(os.environ.get('PREVIEW_DPI', 50))  # Default preview resolution
+app.config['PREVIEW_MAX_DPI'] = int(os.environ.get('PREVIEW_MAX_DPI', 150))
+app.config['PREVIEW_PRERENDER'] = os.environ.get('PREVIEW_PRERENDER', '1') != '0'  # Render page 1 after processing
+app.config['MAX_IN_FLIGHT'] = int(os.environ.get('MAX_IN_FLIGHT', 1))  # CPU-heavy requests at once, on this process's threads
+app.config['MAX_QUEUED_JOBS'] = int(os.environ.get('MAX_QUEUED_JOBS', 20))  # Waiting jobs before /process says 429
+app.config['MAX_EVENT_STREAMS'] = int(os.environ.get('MAX_EVENT_STREAMS', 4))  # Open /jobs/<id>/events streams
+app.config['MAX_EVENT_STREAMS_PER_WORKSPACE'] = int(os.environ.get('MAX_EVENT_STREAMS_PER_WORKSPACE', 1))
+app.config['RETRY_AFTER'] = int(os.environ.get('RETRY_AFTER', 2))  # Seconds sent in Retry-After with a 429
 ALLOWED_EXTENSIONS = {'pdf'}
 
-# Ensure data directories exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
+# Cache of processed files, keyed on file content and the current redaction rules
+result_cache = None
+if app.config['CACHE_MAX_MB'] > 0:
+    result_cache = ResultCache(
+        app.config['CACHE_FOLDER'],
+        max_bytes=app.config['CACHE_MAX_MB'] * 1024 * 1024,
+        version=rules_version(PDFProcessor(input_dir=None, output_dir=None, cleanup_on_init=False,
+                                           save_options=app.config['PDF_SAVE_OPTIONS']))
+    )
+
+# Rendered page previews, keyed on output content, page and DPI
+previews = PreviewCache(
+    app.config['PREVIEW_FOLDER'],
+    max_bytes=app.config['PREVIEW_CACHE_MB'] * 1024 * 1024,
+    default_dpi=app.config['PREVIEW_DPI'],
+    max_dpi=app.config['PREVIEW_MAX_DPI']
+)
+
+# Background jobs for /process
+job_manager = JobManager(max_workers=app.config['JOB_WORKERS'])
 
-# Create a single PDFProcessor instance
-pdf_processor = PDFProcessor(
-    input_dir=app.config['UPLOAD_FOLDER'],
-    output_dir=app.config['OUTPUT_FOLDER']
+def create_processor(input_dir, output_dir):
+    return PDFProcessor(
+        input_dir=input_dir,
+        output_dir=output_dir,
+        workers=app.config['PDF_WORKERS'],
+        split_pages=app.config['PDF_SPLIT_PAGES'],
+        cleanup_on_init=False,
+        cache=result_cache,
+        save_options=app.config['PDF_SAVE_OPTIONS'],
+        window_pages=app.config['PDF_WINDOW_PAGES'],
+        memory_limit=app.config['PDF_MEMORY_LIMIT_MB'] * 1024 * 1024 or None
+    )
+
+# Processor for /redact, which works on bytes only and has no directories
+stream_processor = create_processor(None, None)
+
+# Requests over this limit get 429 instead of waiting for a free CPU
+admission = AdmissionLimit(app.config['MAX_IN_FLIGHT'])
+
+# Every event stream holds a server thread until its job finishes
+event_streams = AdmissionLimit(app.config['MAX_EVENT_STREAMS'], app.config['MAX_EVENT_STREAMS_PER_WORKSPACE'])
+
+# Set by warm_up() once the process is ready to take requests
+ready = threading.Event()
+
+# One workspace with its own input and output folder per session, removed when idle
+workspaces = WorkspaceManager(
+    app.config['WORKSPACE_FOLDER'],
+    create_processor,
+    ttl=app.config['WORKSPACE_TTL'],
+    is_busy=job_manager.has_active
 )
+# Metrics that are read when /metrics is requested
+REGISTRY.gauge('pdf_job_queue_depth', 'Processing jobs waiting to start', callback=job_manager.queue_depth)
+if result_cache is not None:
+    REGISTRY.counter('pdf_cache_hits_total', 'Result cache hits', callback=lambda: result_cache.hits)
+    REGISTRY.counter('pdf_cache_misses_total', 'Result cache misses', callback=lambda: result_cache.misses)
+REGISTRY.counter('pdf_preview_hits_total', 'Previews served from the cache', callback=lambda: previews.hits)
+REGISTRY.counter('pdf_preview_misses_total', 'Previews rendered on request', callback=lambda: previews.misses)
+REGISTRY.gauge('pdf_requests_in_flight', 'CPU-heavy requests running', callback=lambda: admission.in_flight)
+REGISTRY.counter('pdf_requests_rejected_total', 'Requests turned away with 429', callback=lambda: admission.rejected)
+REGISTRY.gauge('pdf_event_streams_open', 'Open job event streams', callback=lambda: event_streams.in_flight)
+
+def warm_up():
+    """Prepare this process for requests and mark it ready.
+
+    Runs text extraction, redaction and rendering once on a small document
+    so MuPDF has loaded its fonts before the first real request, starts the
+    shared worker pool when PDF_WORKERS is above 1, removes stale
+    workspaces and starts the workspace reaper. Call it once per process,
+    after forking.
+    """
+    pdf_document = fitz.open()
+    page = pdf_document.new_page()
+    page.insert_text((72, 72), 'Pris 1 234,-')
+    redact_page(page, [word[:4] for word in page.get_text("words")])
+    page.get_pixmap(dpi=10)
+    pdf_document.close()
+    
+    if app.config['PDF_WORKERS'] > 1:
+        # Start the fork server and a first worker before any job needs them
+        shared_pool(app.config['PDF_WORKERS']).submit(int).result()
+    
+    workspaces.reap()
+    workspaces.start_reaper(interval=min(60, app.config['WORKSPACE_TTL']))
+    ready.set()
+    logger.info("Klar til å ta imot forespørsler")
+
+def busy_response():
+    response = jsonify({'error': 'Serveren er opptatt, prøv igjen om litt'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(app.config['RETRY_AFTER'])
+    return response
+
+def limited(view):
+    """Run a CPU-heavy view behind the admission limit, answering 429 when it is full."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with admission.admit() as admitted:
+            if not admitted:
+                return busy_response()
+            return view(*args, **kwargs)
+    return wrapper
+
+def current_workspace(create=True):
+    """Workspace of the current session, created on first use.
+
+    With create=False (for requests that only read) an existing workspace
+    is returned, or None if the session has none.
+    """
+    workspace_id = g.get('workspace_id') or request.cookies.get(WORKSPACE_COOKIE)
+    if not create:
+        workspace = workspaces.find(workspace_id)
+        if workspace is not None:
+            g.workspace_id = workspace.id
+        return workspace
+    if not WorkspaceManager.valid_id(workspace_id):
+        workspace_id = WorkspaceManager.new_id()
+    g.workspace_id = workspace_id
+    return workspaces.get(workspace_id)
+
+def get_job(job_id):
+    """Job with job_id if it belongs to the current session's workspace."""
+    job = job_manager.get(job_id)
+    workspace = current_workspace(create=False)
+    if job is None or workspace is None or job.owner != workspace.id:
+        return None
+    return job
+
+def processed_files(workspace):
+    """(filename, path) of the processed files in a workspace, sorted by name; none without a workspace."""
+    if workspace is None:
+        return []
+    return [(filename, os.path.join(workspace.output_dir, filename))
+            for filename in sorted(os.listdir(workspace.output_dir)) if filename.startswith('Prosessert_')]
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -71,8 +248,9 @@ def upload_file():
         for file in files:
             if file and allowed_file(file.filename):
                 filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
+                filepath = os.path.join(current_workspace().input_dir, filename)
+                with span('upload'):
+                    file.save(filepath)
                 uploaded_files.append(filename)
                 logger.info(f"File uploaded successfully: {filename}")
             else:
@@ -86,36 +264,152 @@ def upload_file():
         logger.error(f"Error uploading files: {str(e)}")
         return jsonify({'error': 'Feil ved opplasting av filer'}), 500
 
+@app.route('/upload-stream/<filename>', methods=['PUT', 'POST'])
+def upload_stream(filename):
+    """Upload a single PDF as the raw request body, written to disk chunk by chunk."""
+    try:
+        if not allowed_file(filename):
+            return jsonify({'error': f'Ugyldig filtype: {filename}. Kun PDF-filer er tillatt'}), 400
+        
+        filename = secure_filename(filename)
+        filepath = os.path.join(current_workspace().input_dir, filename)
+        with span('upload'):
+            size = save_stream(request.stream, filepath, max_bytes=app.config['MAX_CONTENT_LENGTH'])
+        logger.info(f"File uploaded successfully: {filename} ({size} bytes)")
+        
+        return jsonify({
+            'message': '1 fil(er) lastet opp',
+            'files': [filename]
+        })
+    except UploadTooLarge:
+        return jsonify({'error': 'Filen er for stor'}), 413
+    except Exception as e:
+        logger.error(f"Error uploading file: {str(e)}")
+        return jsonify({'error': 'Feil ved opplasting av filer'}), 500
+
+@app.route('/redact', methods=['POST'])
+@limited
+def redact():
+    """Redact one PDF and return it in the response, without writing anything to disk.
+
+    The PDF is sent either as the raw request body or as the multipart field 'file'.
+    The whole document is held in memory, so it may be at most MAX_REDACT_LENGTH bytes.
+    """
+    max_bytes = app.config['MAX_REDACT_LENGTH']
+    try:
+        if request.content_length is not None and request.content_length > max_bytes:
+            return jsonify({'error': 'Filen er for stor'}), 413
+        if request.mimetype == 'multipart/form-data':
+            if 'file' not in request.files:
+                return jsonify({'error': 'Ingen filer valgt'}), 400
+            file = request.files['file']
+            filename = file.filename
+            data = read_stream(file.stream, max_bytes)
+        else:
+            filename = request.args.get('filename', 'dokument.pdf')
+            data = read_stream(request.stream, max_bytes)
+        if not allowed_file(filename):
+            return jsonify({'error': f'Ugyldig filtype: {filename}. Kun PDF-filer er tillatt'}), 400
+        if not data:
+            return jsonify({'error': 'Ingen filer valgt'}), 400
+        
+        filename = secure_filename(filename) or 'dokument.pdf'
+        output = stream_processor.process_bytes(data, name=filename)
+        return send_file(
+            io.BytesIO(output),
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=f'Prosessert_{filename}'
+        )
+    except fitz.FileDataError:
+        return jsonify({'error': 'Filen er ikke en gyldig PDF'}), 400
+    except (RequestEntityTooLarge, UploadTooLarge):
+        return jsonify({'error': 'Filen er for stor'}), 413
+    except Exception as e:
+        logger.error(f"Error redacting file: {str(e)}")
+        return jsonify({'error': 'Feil ved behandling av filer'}), 500
+
 @app.route('/process', methods=['POST'])
 def process_files():
     try:
-        pdf_processor.process_files()
+        workspace = current_workspace()
+        if not job_manager.has_active(workspace.id) and job_manager.queue_depth() >= app.config['MAX_QUEUED_JOBS']:
+            return busy_response()
         
-        # Get the list of processed files
-        output_files = []
-        for filename in os.listdir(app.config['OUTPUT_FOLDER']):
-            if filename.startswith('Prosessert_'):
-                output_files.append(filename)
-        
-        logger.info(f"Files processed successfully. Found {len(output_files)} processed files.")
-        logger.info(f"Processed files: {output_files}")
+        def process(progress, should_cancel):
+            results = workspace.processor.process_files(progress, should_cancel)
+            if app.config['PREVIEW_PRERENDER']:
+                previews.prerender([result['output_path'] for result in results if result['status'] == 'ok'])
+            return results
         
+        job = job_manager.submit(process, owner=workspace.id)
         return jsonify({
-            'message': 'Filer behandlet',
-            'files': output_files
-        })
+            'message': 'Behandling startet',
+            'job_id': job.id,
+            'status_url': url_for('job_status', job_id=job.id)
+        }), 202
     except Exception as e:
-        logger.error(f"Error processing files: {str(e)}")
+        logger.error(f"Error starting processing job: {str(e)}")
         return jsonify({'error': 'Feil ved behandling av filer'}), 500
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Jobb ikke funnet'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Job status as Server-Sent Events until the job finishes.
+
+    Each stream holds a server thread, so only MAX_EVENT_STREAMS can be open
+    (MAX_EVENT_STREAMS_PER_WORKSPACE per session); others get 429 and should
+    poll /jobs/<job_id> instead.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Jobb ikke funnet'}), 404
+    owner = job.owner
+    if not event_streams.acquire(owner):
+        return busy_response()
+
+    def generate():
+        last = None
+        while True:
+            state = json.dumps(job.to_dict())
+            if state != last:
+                yield f"data: {state}\n\n"
+                last = state
+            if job.finished_state:
+                break
+            time.sleep(0.5)
+
+    response = Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+    response.call_on_close(lambda: event_streams.release(owner))
+    return response
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if get_job(job_id) is None:
+        return jsonify({'error': 'Jobb ikke funnet'}), 404
+    job = job_manager.cancel(job_id)
+    logger.info(f"Cancel requested for job {job_id}")
+    return jsonify({'message': 'Avbryter behandling', 'job_id': job.id, 'status': job.status})
+
 @app.route('/download/<filename>')
 def download_file(filename):
     try:
+        workspace = current_workspace(create=False)
+        if workspace is None:
+            return jsonify({'error': 'Fil ikke funnet'}), 404
+        output_dir = workspace.output_dir
+        
         # Check if the filename already has the prefix
         if not filename.startswith('Prosessert_'):
-            filepath = os.path.join(app.config['OUTPUT_FOLDER'], f'Prosessert_{filename}')
+            filepath = os.path.join(output_dir, f'Prosessert_{filename}')
         else:
-            filepath = os.path.join(app.config['OUTPUT_FOLDER'], filename)
+            filepath = os.path.join(output_dir, filename)
             
         if not os.path.exists(filepath):
             logger.error(f"File not found: {filepath}")
@@ -130,45 +424,87 @@ def download_file(filename):
         logger.error(f"Error downloading file: {str(e)}")
         return jsonify({'error': 'Feil ved nedlasting av fil'}), 500
 
+@app.route('/preview/<filename>/<int:page>')
+def preview(filename, page):
+    """Image of one page (1-based) of a processed file, rendered on first request.
+
+    Optional query parameters: dpi and format (png or jpg). Only rendering
+    counts against the admission limit; cached pages are always served.
+    """
+    try:
+        filename = secure_filename(filename)
+        if not filename.startswith('Prosessert_'):
+            filename = f'Prosessert_{filename}'
+        workspace = current_workspace(create=False)
+        if workspace is None:
+            return jsonify({'error': 'Fil ikke funnet'}), 404
+        filepath = os.path.join(workspace.output_dir, filename)
+        if not os.path.exists(filepath) or page < 1:
+            return jsonify({'error': 'Fil ikke funnet'}), 404
+        
+        image_format = request.args.get('format', 'png')
+        image = previews.get(filepath, page - 1, request.args.get('dpi', type=int), image_format, admission)
+        response = send_file(io.BytesIO(image), mimetype=FORMATS[image_format])
+        response.headers['Cache-Control'] = 'private, max-age=300'
+        return response
+    except PageNotFound:
+        return jsonify({'error': 'Siden finnes ikke'}), 404
+    except PreviewBusy:
+        return busy_response()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error rendering preview: {str(e)}")
+        return jsonify({'error': 'Feil ved visning av side'}), 500
+
 @app.route('/files')
 def list_files():
     try:
-        output_files = []
-        for filename in os.listdir(app.config['OUTPUT_FOLDER']):
-            if filename.startswith('Prosessert_'):
-                output_files.append(filename)
+        output_files = [filename for filename, _ in processed_files(current_workspace(create=False))]
         return jsonify({'files': output_files})
     except Exception as e:
         logger.error(f"Error listing files: {str(e)}")
         return jsonify({'error': 'Feil ved henting av filer'}), 500
 
+@app.route('/cache')
+def cache_stats():
+    if result_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(result_cache.stats(), enabled=True))
+
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    if not ready.is_set():
+        return jsonify({'status': 'starting'}), 503
+    return jsonify({'status': 'ready'})
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/download-all')
 def download_all_files():
     try:
-        # Create a BytesIO object to store the ZIP file
-        memory_file = io.BytesIO()
+        # Add all processed files to the ZIP
+        files = processed_files(current_workspace(create=False))
         
-        # Create the ZIP file
-        with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-            # Add all processed files to the ZIP
-            for filename in os.listdir(app.config['OUTPUT_FOLDER']):
-                if filename.startswith('Prosessert_'):
-                    filepath = os.path.join(app.config['OUTPUT_FOLDER'], filename)
-                    zf.write(filepath, filename)
-        
-        # Seek to the beginning of the BytesIO object
-        memory_file.seek(0)
-        
-        return send_file(
-            memory_file,
+        # Stream the ZIP file chunk by chunk instead of building it in memory
+        zip_stream = iter_zip(files, store_pdfs=app.config['ZIP_STORE_PDFS'])
+        return Response(
+            stream_with_context(zip_stream),
             mimetype='application/zip',
-            as_attachment=True,
-            download_name='processed_files.zip'
+            headers={'Content-Disposition': 'attachment; filename=processed_files.zip'}
         )
     except Exception as e:
         logger.error(f"Error creating ZIP file: {str(e)}")
         return jsonify({'error': 'Feil ved nedlasting av filer'}), 500
 
 if __name__ == '__main__':
+    # Development server; use gunicorn -c gunicorn.conf.py main:app in production
+    warm_up()
     port = int(os.environ.get('PORT', 5002))
-    app.run(host='0.0.0.0', port=port) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, threaded=True) 
\ No newline at end of file
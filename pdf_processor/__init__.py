@@ -1,3 +1,5 @@
 from .processor import PDFProcessor
+from .batch import redact_paths
+from .watcher import FolderWatcher
 
 __version__ = '1.0.0' 
\ No newline at end of file
@@ -0,0 +1,50 @@
+import threading
+from contextlib import contextmanager
+
+
+class AdmissionLimit:
+    """Caps how many CPU-heavy requests run at the same time in this process.
+
+    Requests over the limit are turned away at once instead of queueing, so
+    the ones that are admitted keep a predictable latency. With max_per_key,
+    one key (such as a workspace) can hold at most that many of the slots.
+    """
+
+    def __init__(self, max_in_flight, max_per_key=None):
+        self.max_in_flight = max_in_flight
+        self.max_per_key = max_per_key
+        self.in_flight = 0
+        self.rejected = 0
+        self._per_key = {}  # key -> slots held
+        self._lock = threading.Lock()
+
+    def acquire(self, key=None):
+        """Take a slot if one is free. Returns whether it was taken; release() gives it back."""
+        with self._lock:
+            held = self._per_key.get(key, 0)
+            if self.in_flight >= self.max_in_flight or \
+                    (key is not None and self.max_per_key is not None and held >= self.max_per_key):
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            if key is not None:
+                self._per_key[key] = held + 1
+            return True
+
+    def release(self, key=None):
+        with self._lock:
+            self.in_flight -= 1
+            if key is not None:
+                held = self._per_key.pop(key) - 1
+                if held:
+                    self._per_key[key] = held
+
+    @contextmanager
+    def admit(self, key=None):
+        """Yield True if the request may run and hold its slot until the block ends, else yield False."""
+        admitted = self.acquire(key)
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release(key)
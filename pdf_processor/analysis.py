@@ -0,0 +1,288 @@
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
+
+logger = logging.getLogger(__name__)
+
+COLUMN_TOLERANCE = 30  # Max x-distance between a column header and its values
+HEADER_LOOKAHEAD = 50  # Look this far below the headers to align columns with content
+KAMPANJE_MARGINS = (5, 500, 30)  # Above, right of and below a kampanje header
+MVA_MARGINS = (2, 500, 2)  # Above, right of and below an MVA row
+
+
+def is_number(text):
+    """Check if the text represents a number (with or without thousand separator and currency suffix)."""
+    # Remove any trailing spaces
+    text = text.strip()
+
+    # Remove currency suffix if present
+    text = text.rstrip(",-").rstrip("-")
+
+    # Remove all spaces (thousand separators)
+    text = text.replace(" ", "")
+
+    # Check if what remains is a number
+    return text.isdigit()
+
+
+def may_have_targets(text, carried_columns=False):
+    """Cheap check on the plain text of a page whether it can contain anything to redact.
+
+    Kampanje and MVA sections need their keyword and columns need a "pris"
+    or "total" header. Pages with such a header are always analysed, since
+    their columns carry over to later pages. Without one, columns carried
+    over from an earlier page only matter if the page has digits; such pages
+    still need has_price_row on their words. A page that fails this check
+    gives no redactions, so its words do not have to be analysed.
+    """
+    if has_target_keywords(text):
+        return True
+    if carried_columns:
+        return any(char.isdigit() for char in text)
+    return False
+
+
+def has_target_keywords(text):
+    """Check whether the plain text of a page has a kampanje, MVA or column header keyword."""
+    lowered = text.lower()
+    return 'kampanje' in lowered or 'mva' in lowered or 'gjennomsnittlig' in lowered or has_header_text(text)
+
+
+def has_price_row(numbers, columns):
+    """Check if some row has a number in every one of the given columns.
+
+    numbers are the (x0, y0) of the words that are numbers.
+    """
+    wanted = [x for x in (columns['pris'], columns['total']) if x is not None]
+    if not wanted:
+        return False
+    found = {}  # row key -> indices of the wanted columns with a number in that row
+    for x, y in numbers:
+        row = found.setdefault(round(y, 1), set())
+        row.update(column for column, column_x in enumerate(wanted) if abs(x - column_x) < COLUMN_TOLERANCE)
+        if len(row) == len(wanted):
+            return True
+    return False
+
+
+def has_header_text(text):
+    """Check whether the plain text of a page can hold a Pris or Total header."""
+    lowered = text.lower()
+    return 'pris' in lowered or 'total' in lowered
+
+
+def is_mva_row(row_text):
+    """Check if the joined, lower-cased text of a row belongs to the MVA summary."""
+    return ('herav mva' in row_text or
+            'mva' in row_text and '%' in row_text or
+            'totalbeløp uten mva' in row_text or
+            'gjennomsnittlig' in row_text)
+
+
+class RegionIndex:
+    """Containment lookups of word boxes against a set of rectangular regions.
+
+    Regions are sorted by their top edge, so only regions starting between
+    (word bottom - tallest region) and the word top need to be checked.
+    """
+
+    def __init__(self, regions):
+        self.regions = sorted(regions, key=lambda region: region[1])
+        self.tops = array('d', (region[1] for region in self.regions))
+        self.max_height = max((region[3] - region[1] for region in self.regions), default=0)
+
+    def __bool__(self):
+        return bool(self.regions)
+
+    def contains(self, x0, y0, x1, y1):
+        """Check if the box lies completely inside one of the regions."""
+        start = bisect_left(self.tops, y1 - self.max_height - 1e-6)  # Allow for float rounding
+        stop = bisect_right(self.tops, y0)
+        for region in self.regions[start:stop]:
+            if region[0] <= x0 and x1 <= region[2] and region[1] <= y0 and y1 <= region[3]:
+                return True
+        return False
+
+
+class PageAnalysis:
+    """Word geometry of one page in flat arrays, with the headers and sections found in it.
+
+    The word list from page.get_text("words") is walked once to fill the
+    coordinate arrays, the row index (words grouped by y rounded to one
+    decimal) and the candidate lists for headers, numbers and MVA rows.
+    Columns and sections are then derived from those candidates only.
+
+    A page without a header row takes carried_columns (the columns of an
+    earlier page, see DocumentLayout) if it has a price row: a row with a
+    number in each of those columns.
+    """
+
+    def __init__(self, words, carried_columns=None):
+        self.x0 = array('d')
+        self.y0 = array('d')
+        self.x1 = array('d')
+        self.y1 = array('d')
+        self.texts = []
+        self.rows = {}  # round(y0, 1) -> word indices
+
+        headers = []  # Indices of "pris" and "total" words
+        kampanje = []  # Indices of "kampanje" words
+        self.numbers = []  # Indices of words that are numbers
+        mva_rows = {}  # Row keys that mention mva or gjennomsnittlig, in page order
+
+        for index, word in enumerate(words):
+            x0, y0, x1, y1, text = word[:5]
+            self.x0.append(x0)
+            self.y0.append(y0)
+            self.x1.append(x1)
+            self.y1.append(y1)
+            self.texts.append(text)
+
+            row_key = round(y0, 1)
+            row = self.rows.get(row_key)
+            if row is None:
+                row = self.rows[row_key] = []
+            row.append(index)
+
+            lowered = text.lower()
+            token = lowered.strip()
+            if token == "pris" or token == "total":
+                headers.append(index)
+            elif token == "kampanje":
+                kampanje.append(index)
+            if is_number(text):
+                self.numbers.append(index)
+            if 'mva' in lowered or 'gjennomsnittlig' in lowered:
+                mva_rows[row_key] = True
+
+        self.has_header = bool(headers)
+        self.columns = self._find_columns(headers)
+        self.carried = False
+        if not headers and carried_columns is not None and self._has_price_row(carried_columns):
+            self.columns = dict(carried_columns)
+            self.carried = True
+        self.kampanje_sections = self._find_kampanje_sections(kampanje)
+        self.mva_sections = self._find_mva_sections(mva_rows)
+
+    @property
+    def has_targets(self):
+        return (self.columns['pris'] is not None or self.columns['total'] is not None or
+                bool(self.kampanje_sections) or bool(self.mva_sections))
+
+    def _find_columns(self, headers):
+        """Find the x-coordinates of the Pris and Total columns."""
+        columns = {'pris': None, 'total': None}
+        header_y = None
+
+        # The last header found decides the header row
+        for index in headers:
+            header_y = self.y0[index]
+            if self.texts[index].strip().lower() == "pris":
+                columns['pris'] = self.x0[index]
+                logger.debug(f"Found Pris column at x={self.x0[index]}")
+            else:
+                columns['total'] = self.x0[index]
+                logger.debug(f"Found Total column at x={self.x0[index]}")
+
+        # Align the columns with the numbers just below the headers
+        if header_y is not None:
+            for index in self.numbers:
+                if header_y < self.y0[index] < header_y + HEADER_LOOKAHEAD:
+                    x = self.x0[index]
+                    if columns['pris'] and abs(x - columns['pris']) < COLUMN_TOLERANCE:
+                        columns['pris'] = x
+                    elif columns['total'] and abs(x - columns['total']) < COLUMN_TOLERANCE:
+                        columns['total'] = x
+
+        return columns
+
+    def _has_price_row(self, columns):
+        return has_price_row(((self.x0[index], self.y0[index]) for index in self.numbers), columns)
+
+    def _find_kampanje_sections(self, kampanje):
+        """Sections that cover a kampanje header and the content to the right of and below it."""
+        above, right, below = KAMPANJE_MARGINS
+        sections = []
+        for index in kampanje:
+            sections.append((0, self.y0[index] - above, self.x1[index] + right, self.y1[index] + below))
+            logger.debug(f"Found Kampanje section at y={self.y0[index]}")
+        return sections
+
+    def _find_mva_sections(self, mva_rows):
+        """Sections that cover each row of the MVA summary."""
+        above, right, below = MVA_MARGINS
+        sections = []
+        for row_key in mva_rows:
+            row = sorted(self.rows[row_key], key=lambda index: self.x0[index])
+            row_text = ' '.join(self.texts[index].lower() for index in row)
+            if is_mva_row(row_text):
+                sections.append((
+                    0,
+                    min(self.y0[index] for index in row) - above,
+                    max(self.x1[index] for index in row) + right,
+                    max(self.y1[index] for index in row) + below,
+                ))
+                logger.debug(f"Found MVA section at y={row_key}")
+        return sections
+
+    def _in_column(self, index):
+        x = self.x0[index]
+        for column_x in (self.columns['pris'], self.columns['total']):
+            if column_x is not None and abs(x - column_x) < COLUMN_TOLERANCE:
+                return True
+        return False
+
+    def redaction_rects(self):
+        """Rectangles of all words to redact, ordered by row and then by x."""
+        remove = set(index for index in self.numbers if self._in_column(index))
+
+        sections = RegionIndex(self.kampanje_sections + self.mva_sections)
+        if sections:
+            x0, y0, x1, y1 = self.x0, self.y0, self.x1, self.y1
+            for index in range(len(self.texts)):
+                if index not in remove and sections.contains(x0[index], y0[index], x1[index], y1[index]):
+                    remove.add(index)
+
+        ordered = sorted(remove, key=lambda index: (round(self.y0[index], 1), self.x0[index], index))
+        return [(self.x0[index], self.y0[index], self.x1[index], self.y1[index]) for index in ordered]
+
+
+class DocumentLayout:
+    """Column geometry of a document, carried from page to page.
+
+    The columns found on the last page with a Pris/Total header row are
+    kept per page size and offered to the following pages of that size, so
+    continuation pages without a header row still get their prices removed.
+    """
+
+    def __init__(self):
+        self.templates = {}  # (width, height) -> columns of the last header page of that size
+        self.page_size = None
+        self.carried_pages = 0
+
+    @staticmethod
+    def size_of(page_rect):
+        return (round(page_rect.width), round(page_rect.height))
+
+    def start_page(self, page_rect):
+        self.page_size = self.size_of(page_rect)
+
+    def carried_columns(self):
+        return self.templates.get(self.page_size)
+
+    def update(self, analysis):
+        """Take the columns of a page with a header row and count pages that used carried columns."""
+        if analysis.has_header:
+            self.templates[self.page_size] = dict(analysis.columns)
+        elif analysis.carried:
+            self.carried_pages += 1
+
+    def state(self):
+        """JSON-friendly copy of the templates, to continue the layout in another run."""
+        return [[width, height, columns] for (width, height), columns in self.templates.items()]
+
+    @classmethod
+    def from_state(cls, state):
+        layout = cls()
+        layout.templates = {(width, height): dict(columns) for width, height, columns in state}
+        return layout
@@ -0,0 +1,209 @@
+import os
+import glob
+import json
+import time
+import logging
+import threading
+
+import fitz  # PyMuPDF
+
+from .parallel import make_result
+from .processor import PDFProcessor
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = '.manifest.jsonl'
+
+
+def in_hidden_folder(path):
+    return any(part.startswith('.') and part not in ('.', '..') for part in os.path.dirname(path).split(os.sep))
+
+
+def collect_inputs(patterns, output_dir):
+    """Expand files, directories and glob patterns into (input_path, output_path) pairs.
+
+    PDFs found under a directory keep their path relative to that directory
+    in output_dir; files given directly or through a glob are written to
+    output_dir itself. Each input is included once, and inputs that would
+    end up with the same output name get a numbered suffix. Anything under
+    output_dir or in a hidden folder is left out, so earlier outputs and
+    page-window parts are never processed again.
+    """
+    tasks = []
+    seen = set()
+    outputs = set()
+    output_root = os.path.abspath(output_dir)
+
+    def add(input_path, relative_dir=''):
+        input_path = os.path.abspath(input_path)
+        if input_path in seen or not input_path.lower().endswith('.pdf') or input_path.startswith(output_root + os.sep):
+            return
+        seen.add(input_path)
+        name, extension = os.path.splitext(os.path.basename(input_path))
+        output_path = os.path.normpath(os.path.join(output_dir, relative_dir, f'Prosessert_{name}{extension}'))
+        counter = 1
+        while output_path in outputs:
+            counter += 1
+            output_path = os.path.normpath(os.path.join(output_dir, relative_dir, f'Prosessert_{name}_{counter}{extension}'))
+        if counter > 1:
+            logger.warning(f"{input_path} has the same name as another input, writing {output_path}")
+        outputs.add(output_path)
+        tasks.append((input_path, output_path))
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for dirpath, dirnames, filenames in os.walk(pattern):
+                dirnames[:] = sorted(
+                    dirname for dirname in dirnames
+                    if not dirname.startswith('.') and os.path.abspath(os.path.join(dirpath, dirname)) != output_root
+                )
+                for filename in sorted(filenames):
+                    add(os.path.join(dirpath, filename), os.path.relpath(dirpath, pattern))
+        elif os.path.isfile(pattern):
+            add(pattern)
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                logger.warning(f"No files match {pattern}")
+            for match in matches:
+                if os.path.isfile(match) and not in_hidden_folder(match):
+                    add(match)
+
+    return tasks
+
+
+class Manifest:
+    """Append-only JSON lines record of finished inputs, used to resume an interrupted batch.
+
+    An input counts as done while its size and modification time are
+    unchanged and its output still exists.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._done = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Last line of an interrupted write
+                    self._done[entry['input']] = entry
+
+    @staticmethod
+    def signature(stat):
+        """Size and modification time of an os.stat result, as stored in the manifest."""
+        return stat.st_size, stat.st_mtime
+
+    @classmethod
+    def _signature(cls, input_path):
+        return cls.signature(os.stat(input_path))
+
+    def is_done(self, input_path, output_path):
+        entry = self._done.get(os.path.abspath(input_path))
+        if entry is None or not os.path.exists(output_path):
+            return False
+        try:
+            return (entry['size'], entry['mtime']) == self._signature(input_path)
+        except OSError:
+            return False
+
+    def record(self, input_path, output_path, signature=None, **info):
+        """Mark input_path as done and write the entry to disk right away.
+
+        signature is the (size, mtime) of the input that was processed; by
+        default the file is stat'ed now.
+        """
+        size, mtime = signature if signature is not None else self._signature(input_path)
+        entry = dict(info, input=os.path.abspath(input_path), output=output_path, size=size, mtime=mtime)
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            self._done[entry['input']] = entry
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def __len__(self):
+        return len(self._done)
+
+
+def summarize(results, seconds, skipped=0):
+    """Totals and throughput of a batch run."""
+    processed = [result for result in results if result['status'] == 'ok']
+    pages = sum(result['pages'] for result in processed)
+    return {
+        'results': results,
+        'files': len(processed),
+        'pages': pages,
+        'errors': sum(1 for result in results if result['status'] == 'error'),
+        'skipped': skipped,
+        'seconds': seconds,
+        'files_per_second': len(processed) / seconds if seconds else 0.0,
+        'pages_per_second': pages / seconds if seconds else 0.0,
+    }
+
+
+def redact_paths(inputs, output_dir, workers=1, split_pages=None, resume=False, dry_run=False,
+                 cache=None, progress=None, save_options=None, window_pages=None, memory_limit=None):
+    """Redact PDFs given as files, directories or glob patterns and write them to output_dir.
+
+    With resume, inputs recorded in the output directory's manifest are
+    skipped. With dry_run nothing is written; each result lists the
+    redactions that would be made under 'redactions'. save_options are passed
+    to Document.save (see check_save_options). Documents with more than
+    window_pages pages are processed in windows (see PDFProcessor). Returns
+    a summary dict with the per-file results and throughput.
+    """
+    tasks = collect_inputs(inputs, output_dir)
+    manifest = None
+    skipped = 0
+
+    if not dry_run:
+        os.makedirs(output_dir, exist_ok=True)
+        manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME))
+        if resume:
+            remaining = [task for task in tasks if not manifest.is_done(*task)]
+            skipped = len(tasks) - len(remaining)
+            tasks = remaining
+            if skipped:
+                logger.info(f"Hopper over {skipped} filer som allerede er prosessert")
+        for output_parent in set(os.path.dirname(output_path) for _, output_path in tasks):
+            os.makedirs(output_parent, exist_ok=True)
+
+    processor = PDFProcessor(input_dir=None, output_dir=output_dir, workers=workers, split_pages=split_pages,
+                             cleanup_on_init=False, cache=cache, save_options=save_options,
+                             window_pages=window_pages, memory_limit=memory_limit)
+    start = time.perf_counter()
+
+    if dry_run:
+        results = []
+        for input_path, output_path in tasks:
+            try:
+                with fitz.open(input_path) as pdf_document:
+                    page_count = pdf_document.page_count
+                result = make_result(input_path, output_path, pages=page_count)
+                result['redactions'] = processor.find_redactions(input_path)
+            except Exception as e:
+                result = make_result(input_path, output_path, error=e)
+            result['input_path'] = input_path
+            results.append(result)
+            if progress:
+                progress('file_done', result)
+        return summarize(results, time.perf_counter() - start)
+
+    paths = dict((output_path, input_path) for input_path, output_path in tasks)
+
+    def on_progress(event, data):
+        if event == 'file_done' and data['status'] == 'ok':
+            manifest.record(paths[data['output_path']], data['output_path'], pages=data['pages'])
+        if progress:
+            progress(event, data)
+
+    results = processor.process_paths(tasks, on_progress)
+    for (input_path, _), result in zip(tasks, results):
+        result['input_path'] = input_path
+    return summarize(results, time.perf_counter() - start, skipped)
+
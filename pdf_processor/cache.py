@@ -0,0 +1,194 @@
+import os
+import json
+import shutil
+import hashlib
+import inspect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+EVICT_TO = 0.9  # Share of max_bytes eviction frees down to, so the next stores do not trigger another scan
+
+
+def rules_version(processor):
+    """Fingerprint of the redaction rules a processor applies.
+
+    The source code of every rule method listed in processor.rule_methods and
+    of the modules in processor.rule_modules is hashed, so any change to the
+    rules produces a new version and old cache entries stop matching. The
+    values in processor.rule_settings (such as the text extraction flags) and
+    save options other than the defaults are part of the version as well.
+    """
+    digest = hashlib.sha256()
+    sources = [getattr(type(processor), name) for name in processor.rule_methods]
+    sources.extend(processor.rule_modules)
+    for source in sources:
+        try:
+            digest.update(inspect.getsource(source).encode('utf-8'))
+        except (OSError, TypeError):
+            digest.update(repr(source).encode('utf-8'))
+    rule_settings = getattr(processor, 'rule_settings', None)
+    if rule_settings:
+        digest.update(json.dumps(rule_settings, sort_keys=True).encode('utf-8'))
+    save_options = getattr(processor, 'save_options', None)
+    if save_options:
+        digest.update(json.dumps(save_options, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(source, target):
+    """Hard-link source to target, falling back to a copy across file systems."""
+    if os.path.exists(target) and os.path.samefile(source, target):
+        return
+    tmp_target = f'{target}.tmp-{os.getpid()}-{threading.get_ident()}'
+    try:
+        os.link(source, tmp_target)
+    except OSError:
+        shutil.copy2(source, tmp_target)
+    os.replace(tmp_target, target)
+
+
+class DiskLRU:
+    """Total size and least recently used eviction of the entry files of a disk cache.
+
+    entries() yields the paths of the entry files; the modification time of
+    an entry is its last use. Once the total size goes above max_bytes, the
+    oldest entries are removed with remove(path) until it is below EVICT_TO
+    of max_bytes.
+    """
+
+    def __init__(self, max_bytes, entries, remove=os.remove):
+        self.max_bytes = max_bytes
+        self._entries = entries
+        self._remove = remove
+        self._lock = threading.Lock()
+        self.size = sum(os.path.getsize(path) for path in entries())
+
+    def added(self, size, replaced=False):
+        """Count an entry of size bytes that was just stored, then evict if the cache is too big.
+
+        replaced means it took the place of an entry with the same key, which was already counted.
+        """
+        with self._lock:
+            if not replaced:
+                self.size += size
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        self.size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TO
+        for _, size, path in entries:
+            if self.size <= target:
+                break
+            try:
+                self._remove(path)
+            except OSError:
+                continue
+            self.size -= size
+
+
+class ResultCache:
+    """Disk cache of processed PDFs keyed on input content hash and rules version.
+
+    Entries are evicted least recently used first (see DiskLRU).
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024, version=''):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lru = DiskLRU(max_bytes, self._entries, self._remove_entry)
+
+    def key(self, input_path):
+        """Cache key of an input file for the current rules version."""
+        return f'{file_hash(input_path)}-{self.version}'
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.pdf')
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if filename.endswith('.pdf'):
+                    yield os.path.join(dirpath, filename)
+
+    def get(self, key, output_path):
+        """Place the cached output for key at output_path.
+
+        Returns the stored metadata dict on a hit and None on a miss.
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(f'{entry_path[:-4]}.json') as f:
+                meta = json.load(f)
+            link_or_copy(entry_path, output_path)
+            os.utime(entry_path)  # Mark as recently used
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        logger.info(f"Hentet fra cache: {os.path.basename(output_path)}")
+        return meta
+
+    def put(self, key, output_path, **meta):
+        """Store a processed output under key, then evict old entries if needed."""
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        try:
+            existed = os.path.exists(entry_path)
+            link_or_copy(output_path, entry_path)
+            with open(f'{entry_path[:-4]}.json', 'w') as f:
+                json.dump(meta, f)
+        except OSError as e:
+            logger.error(f"Could not store {output_path} in cache: {str(e)}")
+            return
+
+        self._lru.added(os.path.getsize(entry_path), replaced=existed)
+
+    def _remove_entry(self, path):
+        """Remove an evicted output and its metadata."""
+        os.remove(path)
+        try:
+            os.remove(f'{path[:-4]}.json')
+        except OSError:
+            pass
+        logger.info(f"Fjernet fra cache: {os.path.basename(path)}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'bytes': self._lru.size,
+                'max_bytes': self.max_bytes,
+                'version': self.version,
+            }
@@ -0,0 +1,127 @@
+import os
+import sys
+import argparse
+import logging
+
+from .batch import redact_paths
+from .cache import ResultCache, rules_version
+from .processor import PDFProcessor
+from .watcher import FolderWatcher
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m pdf_processor',
+        description='Fjern priser, kampanjer og MVA-oppsummering fra PDF-filer.'
+    )
+    parser.add_argument('inputs', nargs='+', help='PDF-filer, mapper eller glob-mønstre (f.eks. "arkiv/**/*.pdf")')
+    parser.add_argument('-o', '--output', required=True, help='mappe for prosesserte filer')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='antall prosesser (standard: antall kjerner)')
+    parser.add_argument('--split-pages', type=int, default=None,
+                        help='del dokumenter med flere sider enn dette på tvers av prosessene')
+    parser.add_argument('--window-pages', type=int, default=None,
+                        help='prosesser dokumenter med flere sider enn dette i vinduer på så mange sider, '
+                             'med lavere minnebruk')
+    parser.add_argument('--memory-limit-mb', type=int, default=None,
+                        help='lagre et vindu tidligere når prosessen bruker mer minne enn dette (med --window-pages)')
+    parser.add_argument('--resume', action='store_true',
+                        help='hopp over filer som allerede står i manifestet i output-mappen')
+    parser.add_argument('--dry-run', action='store_true', help='vis hva som ville blitt fjernet, uten å skrive filer')
+    parser.add_argument('--cache-dir', help='bruk en resultat-cache i denne mappen')
+    parser.add_argument('--cache-mb', type=int, default=512, help='maksimal størrelse på cachen i MB')
+    parser.add_argument('--garbage', type=int, default=0, choices=range(5),
+                        help='fjern ubrukte objekter ved lagring, 0-4 (mer CPU, mindre filer)')
+    parser.add_argument('--deflate', action='store_true', help='komprimer ukomprimerte strømmer ved lagring')
+    parser.add_argument('--watch', action='store_true',
+                        help='overvåk input-mappen og prosesser nye PDF-er fortløpende (avslutt med Ctrl+C)')
+    parser.add_argument('--interval', type=float, default=1.0, help='sekunder mellom hver sjekk av mappen med --watch')
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help='sekunder en fil må være uendret før den prosesseres med --watch')
+    parser.add_argument('-v', '--verbose', action='store_true', help='vis logg fra prosesseringen')
+    return parser
+
+
+def print_dry_run(summary, out):
+    for result in summary['results']:
+        if result['status'] != 'ok':
+            print(f"{result['input_path']}: FEIL {result['error']}", file=out)
+            continue
+        redactions = result['redactions']
+        count = sum(len(page['rects']) for page in redactions)
+        print(f"{result['input_path']}: {count} felt på {len(redactions)} av {result['pages']} sider", file=out)
+        for page in redactions:
+            words = ' | '.join(text for text in page['texts'] if text)
+            print(f"  side {page['page']}: {words}", file=out)
+
+
+def print_summary(summary, out):
+    for result in summary['results']:
+        if result['status'] == 'error':
+            print(f"FEIL {result['input_path']}: {result['error']}", file=out)
+    print(
+        f"{summary['files']} filer, {summary['pages']} sider på {summary['seconds']:.1f} s "
+        f"({summary['files_per_second']:.1f} filer/s, {summary['pages_per_second']:.1f} sider/s), "
+        f"{summary['skipped']} hoppet over, {summary['errors']} feil",
+        file=out
+    )
+
+
+def memory_limit(args):
+    return args.memory_limit_mb * 1024 * 1024 if args.memory_limit_mb else None
+
+
+def watch(args, save_options, out):
+    if len(args.inputs) != 1 or not os.path.isdir(args.inputs[0]):
+        print('--watch tar én mappe som input', file=out)
+        return 2
+    if os.path.realpath(args.inputs[0]) == os.path.realpath(args.output):
+        print('--watch kan ikke skrive til mappen som overvåkes', file=out)
+        return 2
+    logging.getLogger('pdf_processor').setLevel(logging.INFO)
+    watcher = FolderWatcher(args.inputs[0], args.output, workers=args.workers, interval=args.interval,
+                            settle=args.settle, save_options=save_options, window_pages=args.window_pages,
+                            memory_limit=memory_limit(args))
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+        print('Avsluttet.', file=out)
+    return 0
+
+
+def main(argv=None, out=sys.stdout):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+
+    save_options = {'garbage': args.garbage, 'deflate': args.deflate} if args.garbage or args.deflate else None
+
+    if args.watch:
+        return watch(args, save_options, out)
+
+    cache = None
+    if args.cache_dir:
+        version = rules_version(PDFProcessor(input_dir=None, output_dir=None, cleanup_on_init=False,
+                                             save_options=save_options))
+        cache = ResultCache(args.cache_dir, max_bytes=args.cache_mb * 1024 * 1024, version=version)
+
+    try:
+        summary = redact_paths(
+            args.inputs, args.output,
+            workers=args.workers,
+            split_pages=args.split_pages,
+            resume=args.resume,
+            dry_run=args.dry_run,
+            cache=cache,
+            save_options=save_options,
+            window_pages=args.window_pages,
+            memory_limit=memory_limit(args)
+        )
+    except KeyboardInterrupt:
+        print('Avbrutt. Kjør igjen med --resume for å fortsette.', file=out)
+        return 130
+
+    if args.dry_run:
+        print_dry_run(summary, out)
+    print_summary(summary, out)
+    return 1 if summary['errors'] else 0
@@ -0,0 +1,150 @@
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATES = ('done', 'failed', 'cancelled')
+
+
+class Job:
+    """State and progress of one background processing run."""
+
+    def __init__(self, owner=None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner  # Workspace the job belongs to
+        self.status = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.files = {}  # filename -> {'status', 'pages', 'pages_done', 'error'}
+        self.results = []
+        self.error = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def finished_state(self):
+        return self.status in FINISHED_STATES
+
+    def cancel(self):
+        self._cancel.set()
+
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def update_progress(self, event, data):
+        """Progress callback passed to PDFProcessor.process_files."""
+        with self._lock:
+            if event == 'batch':
+                for filename in data['files']:
+                    self.files[filename] = {'status': 'queued', 'pages': None, 'pages_done': 0, 'error': None}
+            elif event == 'file_started':
+                entry = self.files.setdefault(data['file'], {'pages_done': 0, 'error': None})
+                entry.update(status='running', pages=data['pages'])
+            elif event == 'page_done':
+                entry = self.files.setdefault(data['file'], {'status': 'running', 'error': None})
+                entry.update(pages=data['pages'], pages_done=data['page'])
+            elif event == 'file_done':
+                entry = self.files.setdefault(data['file'], {'pages_done': 0})
+                entry.update(status=data['status'], error=data['error'])
+                if data['status'] == 'ok':
+                    entry.update(pages=data['pages'], pages_done=data['pages'])
+
+    def to_dict(self):
+        with self._lock:
+            files = {name: dict(entry) for name, entry in self.files.items()}
+        done = sum(1 for entry in files.values() if entry['status'] in ('ok', 'error', 'cancelled'))
+        return {
+            'id': self.id,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'files_total': len(files),
+            'files_done': done,
+            'files': files,
+            'errors': [{'file': r['file'], 'error': r['error']} for r in self.results if r['status'] == 'error'],
+            'error': self.error,
+        }
+
+
+class JobManager:
+    """Runs processing jobs on a background thread pool and keeps their state for polling.
+
+    Jobs are executed by max_workers threads; with the default of one, jobs
+    submitted from several sessions run one after another. An owner has at
+    most one unfinished job at a time. Only the most recent max_jobs
+    finished jobs are kept.
+    """
+
+    def __init__(self, max_workers=1, max_jobs=100):
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func, owner=None):
+        """Queue func(progress=..., should_cancel=...) as a new job and return it.
+
+        If owner already has a queued or running job, that job is returned
+        instead of starting the same work twice.
+        """
+        with self._lock:
+            if owner is not None:
+                for job in self._jobs.values():
+                    if job.owner == owner and not job.finished_state:
+                        return job
+            job = Job(owner)
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, func)
+        logger.info(f"Jobb {job.id} lagt i kø")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel()
+        if job.status == 'queued':
+            job.status = 'cancelled'
+            job.finished = time.time()
+        return job
+
+    def has_active(self, owner):
+        with self._lock:
+            return any(job.owner == owner and not job.finished_state for job in self._jobs.values())
+
+    def queue_depth(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == 'queued')
+
+    def _run(self, job, func):
+        if job.cancel_requested():
+            return
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            job.results = func(progress=job.update_progress, should_cancel=job.cancel_requested)
+            job.status = 'cancelled' if job.cancel_requested() else 'done'
+        except Exception as e:
+            logger.error(f"Error in job {job.id}: {str(e)}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished = time.time()
+            logger.info(f"Jobb {job.id} ferdig med status {job.status}")
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.finished_state]
+        finished.sort(key=lambda job: job.finished or job.created)
+        for job in finished[:max(0, len(finished) - self.max_jobs)]:
+            del self._jobs[job.id]
+
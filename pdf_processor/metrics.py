@@ -0,0 +1,180 @@
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base of all metrics. A metric with a callback reads its value from it when rendered."""
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        if self.callback is not None:
+            try:
+                value = self.callback()
+                with self._lock:
+                    self._values[()] = value
+            except Exception as e:
+                logger.error(f"Error reading metric {self.name}: {str(e)}")
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += 1
+            state[2] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        for key, (bucket_counts, count, total) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", "+Inf")])} {count}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Counter(name, documentation, labelnames, callback))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'pdf_stage_seconds', 'Time spent per processing stage', ['stage'])
+ERRORS = REGISTRY.counter(
+    'pdf_errors_total', 'Errors per processing stage', ['stage'])
+FILES_PROCESSED = REGISTRY.counter(
+    'pdf_files_processed_total', 'Files handled, by result status', ['status'])
+PAGES_PROCESSED = REGISTRY.counter(
+    'pdf_pages_processed_total', 'Pages processed; rate() gives pages/s')
+PAGES_SKIPPED = REGISTRY.counter(
+    'pdf_pages_skipped_total', 'Pages skipped by triage because they cannot contain anything to redact')
+PAGES_CARRIED = REGISTRY.counter(
+    'pdf_pages_columns_carried_total', 'Pages without a header row that used the columns of an earlier page')
+WINDOWS_FLUSHED = REGISTRY.counter(
+    'pdf_windows_flushed_total', 'Page windows of large documents written to a part file')
+REDACTIONS_PER_PAGE = REGISTRY.histogram(
+    'pdf_redactions_per_page', 'Redaction rectangles applied per page', buckets=COUNT_BUCKETS)
+
+
+@contextmanager
+def span(stage, timings=None):
+    """Time a block as one stage: observe it in pdf_stage_seconds and count errors.
+
+    If timings (a dict) is given, the duration is also added to timings[stage].
+    Exceptions with counts_as_error = False, such as a cancellation, are not
+    counted as errors.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        if getattr(e, 'counts_as_error', True):
+            ERRORS.inc(stage=stage)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage=stage)
+        if timings is not None:
+            timings[stage] += duration
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"span stage={stage} duration_ms={duration * 1000:.2f}")
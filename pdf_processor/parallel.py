@@ -0,0 +1,188 @@
+import os
+import shutil
+import tempfile
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+_pools = {}  # Number of workers -> pool shared by every batch in this process
+_pools_lock = threading.Lock()
+
+
+def make_result(input_path, output_path, pages=0, error=None, status=None, cached=False):
+    """Build the result dict reported for every processed file."""
+    if status is None:
+        status = 'error' if error is not None else 'ok'
+    return {
+        'file': os.path.basename(input_path),
+        'output': os.path.basename(output_path),
+        'output_path': output_path,
+        'status': status,
+        'pages': pages,
+        'cached': cached,
+        'error': str(error) if error is not None else None,
+    }
+
+
+def notify(progress, event, data):
+    """Report a progress event without letting a failing callback break processing."""
+    if progress is None:
+        return
+    try:
+        progress(event, data)
+    except Exception as e:
+        logger.error(f"Error in progress callback for {event}: {str(e)}")
+
+
+def _worker_processor(save_options=None, window_pages=None, memory_limit=None):
+    """Create a processor inside a worker process without touching any directory."""
+    from .processor import PDFProcessor
+    return PDFProcessor(input_dir=None, output_dir=None, cleanup_on_init=False, save_options=save_options,
+                        window_pages=window_pages, memory_limit=memory_limit)
+
+
+def _process_file_worker(input_path, output_path, save_options=None, window_pages=None, memory_limit=None):
+    processor = _worker_processor(save_options, window_pages, memory_limit)
+    return processor.process_single_file(input_path, output_path)
+
+
+def _process_range_worker(input_path, output_path, start, stop):
+    return _worker_processor().process_page_range(input_path, output_path, start, stop)
+
+
+def assemble_parts(part_paths, output_path, save_options=None, source_path=None):
+    """Join the page-range outputs, in order, into one PDF.
+
+    The metadata of source_path, the document the parts were cut from, is
+    copied to the result. Like a document processed in one piece it has no
+    outline: insert_pdf does not copy one.
+    """
+    pdf_document = fitz.open()
+    for part_path in part_paths:
+        with fitz.open(part_path) as part:
+            pdf_document.insert_pdf(part)
+    if source_path is not None:
+        with fitz.open(source_path) as source:
+            pdf_document.set_metadata(source.metadata)
+    tmp_path = f'{output_path}.tmp'
+    pdf_document.save(tmp_path, **(save_options or {}))
+    pdf_document.close()
+    os.replace(tmp_path, output_path)
+
+
+def pool_context():
+    """Multiprocessing context for worker processes.
+
+    Uses forkserver (spawn where that is not available) rather than fork:
+    the pools are started from web server and job threads, and a child
+    forked from a process with other threads can hang on a lock that one of
+    them held.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([f'{__package__}.processor'])  # Workers start with fitz already imported
+    return context
+
+
+def shared_pool(workers):
+    """Process pool with the given number of workers, created once and reused by every batch."""
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+        return pool
+
+
+def discard_pool(workers, pool):
+    """Drop a pool that broke because a worker died; the next batch gets a new one."""
+    with _pools_lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False)
+
+
+def page_ranges(page_count, split_pages):
+    """Split page_count pages into consecutive [start, stop) ranges of split_pages pages."""
+    return [(start, min(start + split_pages, page_count)) for start in range(0, page_count, split_pages)]
+
+
+def process_in_pool(tasks, workers, split_pages=None, progress=None, should_cancel=None, save_options=None,
+                    window_pages=None, memory_limit=None):
+    """Process (input_path, output_path) tasks in a pool of worker processes.
+
+    Each worker opens its own fitz document. Documents with more than
+    split_pages pages are split into page ranges that are processed in
+    parallel and joined afterwards. Results are returned in task order and a
+    failing file never aborts the rest of the batch.
+
+    The pool is shared with other batches in this process (see shared_pool).
+    Only 'file_done' progress events are reported from the pool. When
+    should_cancel returns True, files that have not started are cancelled.
+    save_options apply to the final output; page-range parts are saved with
+    the defaults. window_pages and memory_limit are passed to the processor
+    of each whole file (see PDFProcessor).
+    """
+    results = [None] * len(tasks)
+    pending = []  # (index, [futures], part_paths or None, parts_dir or None)
+
+    pool = shared_pool(workers)
+    broken = False  # A worker died, so the pool cannot be used for the next batch
+
+    for index, (input_path, output_path) in enumerate(tasks):
+        try:
+            page_count = None
+            if split_pages:
+                with fitz.open(input_path) as pdf_document:
+                    page_count = pdf_document.page_count
+
+            if page_count is not None and page_count > split_pages:
+                parts_dir = tempfile.mkdtemp(prefix='.parts_', dir=os.path.dirname(output_path))
+                part_paths = []
+                futures = []
+                for start, stop in page_ranges(page_count, split_pages):
+                    part_path = os.path.join(parts_dir, f'{start:06d}.pdf')
+                    part_paths.append(part_path)
+                    futures.append(pool.submit(_process_range_worker, input_path, part_path, start, stop))
+                pending.append((index, futures, part_paths, parts_dir))
+            else:
+                future = pool.submit(_process_file_worker, input_path, output_path, save_options,
+                                     window_pages, memory_limit)
+                pending.append((index, [future], None, None))
+        except Exception as e:
+            broken = broken or isinstance(e, BrokenProcessPool)
+            logger.error(f"Error scheduling file {input_path}: {str(e)}")
+            results[index] = make_result(input_path, output_path, error=e)
+            notify(progress, 'file_done', results[index])
+
+    for index, futures, part_paths, parts_dir in pending:
+        input_path, output_path = tasks[index]
+        if should_cancel and should_cancel():
+            for future in futures:
+                future.cancel()
+        try:
+            pages = sum(future.result() for future in futures)
+            if part_paths is not None:
+                assemble_parts(part_paths, output_path, save_options, source_path=input_path)
+                logger.info(f"Prosessert fil: {os.path.basename(input_path)} ({len(part_paths)} deler)")
+            results[index] = make_result(input_path, output_path, pages=pages)
+        except CancelledError:
+            results[index] = make_result(input_path, output_path, status='cancelled')
+        except Exception as e:
+            broken = broken or isinstance(e, BrokenProcessPool)
+            logger.error(f"Error processing file {input_path}: {str(e)}")
+            results[index] = make_result(input_path, output_path, error=e)
+        finally:
+            if parts_dir is not None:
+                shutil.rmtree(parts_dir, ignore_errors=True)
+        notify(progress, 'file_done', results[index])
+
+    if broken:
+        discard_pool(workers, pool)
+    return results
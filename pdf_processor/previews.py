@@ -0,0 +1,152 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+
+from .cache import DiskLRU, file_hash
+from .metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Image formats Pixmap.tobytes can write, with their mimetype
+FORMATS = {'png': 'image/png', 'jpg': 'image/jpeg'}
+MAX_KNOWN_HASHES = 1000  # Output hashes remembered between requests
+
+
+class PageNotFound(Exception):
+    """Raised when a preview is requested for a page the document does not have."""
+    counts_as_error = False  # A bad request, not counted in pdf_errors_total
+
+
+class PreviewBusy(Exception):
+    """Raised when a page has to be rendered but the admission limit is full."""
+
+
+def render_page(pdf_path, page_number, dpi=50, image_format='png'):
+    """Render one page (0-based) of a PDF to image bytes."""
+    with fitz.open(pdf_path) as pdf_document:
+        if not 0 <= page_number < pdf_document.page_count:
+            raise PageNotFound(f'{os.path.basename(pdf_path)} has no page {page_number + 1}')
+        pixmap = pdf_document[page_number].get_pixmap(dpi=dpi)
+        return pixmap.tobytes(image_format)
+
+
+class PreviewCache:
+    """Disk cache of rendered pages keyed on output content hash, page, DPI and format.
+
+    Entries are evicted least recently used first (see DiskLRU). Pages are
+    rendered on first request; prerender() does the same on a background
+    thread.
+    """
+
+    def __init__(self, cache_dir, max_bytes=64 * 1024 * 1024, default_dpi=50, max_dpi=150):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.default_dpi = default_dpi
+        self.max_dpi = max_dpi
+        self.hits = 0
+        self.misses = 0
+        self._hashes = {}  # path -> ((size, mtime), content hash)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='preview')
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lru = DiskLRU(max_bytes, self._entries)
+
+    def _entries(self):
+        for filename in os.listdir(self.cache_dir):
+            if filename.rsplit('.', 1)[-1] in FORMATS:
+                yield os.path.join(self.cache_dir, filename)
+
+    def _content_hash(self, pdf_path):
+        """Hash of a file, recomputed only when its size or modification time changes."""
+        stat = os.stat(pdf_path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            known = self._hashes.get(pdf_path)
+        if known is not None and known[0] == signature:
+            return known[1]
+        digest = file_hash(pdf_path)
+        with self._lock:
+            if len(self._hashes) >= MAX_KNOWN_HASHES:
+                self._hashes.clear()
+            self._hashes[pdf_path] = (signature, digest)
+        return digest
+
+    def get(self, pdf_path, page_number, dpi=None, image_format='png', admission=None):
+        """Return the image of page_number (0-based) of pdf_path, rendering it if needed.
+
+        Raises ValueError for an unknown format or a DPI outside 1..max_dpi,
+        and PageNotFound for a page the document does not have. With an
+        AdmissionLimit, only rendering takes a slot; cache hits are served
+        regardless, and PreviewBusy is raised when a render is not admitted.
+        """
+        dpi = self.default_dpi if dpi is None else dpi
+        if image_format not in FORMATS:
+            raise ValueError(f'Unknown preview format: {image_format}')
+        if not 1 <= dpi <= self.max_dpi:
+            raise ValueError(f'DPI must be between 1 and {self.max_dpi}')
+
+        key = f'{self._content_hash(pdf_path)}-{page_number}-{dpi}.{image_format}'
+        entry_path = os.path.join(self.cache_dir, key)
+        try:
+            with open(entry_path, 'rb') as f:
+                data = f.read()
+            os.utime(entry_path)  # Mark as recently used
+            with self._lock:
+                self.hits += 1
+            return data
+        except OSError:
+            pass
+
+        with self._lock:
+            self.misses += 1
+        if admission is None:
+            data = self._render(pdf_path, page_number, dpi, image_format)
+        else:
+            with admission.admit() as admitted:
+                if not admitted:
+                    raise PreviewBusy()
+                data = self._render(pdf_path, page_number, dpi, image_format)
+        self._put(entry_path, data)
+        return data
+
+    def _render(self, pdf_path, page_number, dpi, image_format):
+        with span('preview'):
+            return render_page(pdf_path, page_number, dpi, image_format)
+
+    def _put(self, entry_path, data):
+        tmp_path = f'{entry_path}.tmp-{threading.get_ident()}'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            existed = os.path.exists(entry_path)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            logger.error(f"Could not store preview {os.path.basename(entry_path)}: {str(e)}")
+            return
+
+        self._lru.added(len(data), replaced=existed)
+
+    def prerender(self, pdf_paths, page_number=0):
+        """Render page_number of each PDF at the default DPI on a background thread."""
+        def run():
+            for pdf_path in pdf_paths:
+                try:
+                    self.get(pdf_path, page_number)
+                except Exception as e:
+                    logger.error(f"Error rendering preview of {pdf_path}: {str(e)}")
+
+        return self._executor.submit(run)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'bytes': self._lru.size,
+                'max_bytes': self.max_bytes,
+            }
@@ -1,237 +1,568 @@
+import io
 import os
 import fitz  # PyMuPDF
 import logging
 import atexit
 import shutil
+from collections import defaultdict
+
+from .parallel import assemble_parts, make_result, notify, process_in_pool
+from . import analysis, redaction
+from .analysis import (DocumentLayout, PageAnalysis, has_header_text, has_price_row, has_target_keywords, is_number,
+                       may_have_targets)
+from .cache import rules_version
+from .metrics import (FILES_PROCESSED, PAGES_CARRIED, PAGES_PROCESSED, PAGES_SKIPPED, REDACTIONS_PER_PAGE,
+                      WINDOWS_FLUSHED, span)
+from .redaction import clear_outline, redact_page
+from .windows import WindowCheckpoint, resident_bytes
 
 logger = logging.getLogger(__name__)
 
+# Document.save options that can be configured
+SAVE_OPTIONS = ('garbage', 'deflate', 'deflate_images', 'deflate_fonts', 'clean', 'use_objstms', 'incremental')
+
+# Flags of page.get_text("words"): no images, ligatures and whitespace kept as they are
+TEXT_FLAGS = fitz.TEXTFLAGS_WORDS
+
+
+class ProcessingCancelled(Exception):
+    """Raised when processing is stopped because cancellation was requested."""
+    counts_as_error = False  # Not counted in pdf_errors_total
+
+
+def check_save_options(options):
+    """Validate keyword arguments for Document.save and return them as a dict.
+
+    garbage (0-4) and deflate trade CPU time for a smaller output. Incremental
+    saves are refused: they append the changes and keep the original page
+    content, so the redacted text could be recovered from the file.
+    """
+    options = dict(options or {})
+    if options.get('incremental'):
+        raise ValueError('Incremental saves keep the redacted content in the file and cannot be used')
+    unknown = set(options) - set(SAVE_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown save options: {', '.join(sorted(unknown))}")
+    if not 0 <= int(options.get('garbage', 0)) <= 4:
+        raise ValueError('garbage must be between 0 and 4')
+    return options
+
+
 class PDFProcessor:
-    def __init__(self, input_dir='input', output_dir='output'):
+    # Methods, modules and settings that decide what is redacted; they make up the rules version
+    rule_methods = ('_collect_redaction_rects', '_page_redactions', '_redact_document')
+    rule_modules = (analysis, redaction)
+    rule_settings = {'text_flags': TEXT_FLAGS}
+
+    def __init__(self, input_dir='input', output_dir='output', workers=1, split_pages=None,
+                 cleanup_on_init=True, cache=None, save_options=None, window_pages=None, memory_limit=None):
         self.input_dir = input_dir
         self.output_dir = output_dir
+        self.workers = workers  # Number of worker processes, 1 = serial
+        self.split_pages = split_pages  # Split documents with more pages than this across workers
+        self.cache = cache  # Optional ResultCache for already processed inputs
+        self.save_options = check_save_options(save_options)  # Keyword arguments for Document.save
+        self.window_pages = window_pages  # Process documents with more pages than this in windows of this size
+        self.memory_limit = memory_limit  # Bytes of resident memory at which a window is flushed early
         self.processed_files = set()  # Track processed files
+        self.stage_times = defaultdict(float)  # Seconds spent per stage: open, extract, triage, detect, redact, save
+        self.pages_skipped = 0  # Pages that triage found could not contain anything to redact
+        self.pages_carried = 0  # Pages without a header row that used the columns of an earlier page
         
-        # Clean up any existing files on initialization
-        self.cleanup()
-        
-        # Register cleanup function
-        atexit.register(self.cleanup)
+        if cleanup_on_init:
+            # Clean up any existing files on initialization
+            self.cleanup()
+            
+            # Register cleanup function
+            atexit.register(self.cleanup)
         
-    def process_files(self):
-        """Process all PDF files in the input directory."""
+    def process_files(self, progress=None, should_cancel=None):
+        """Process all PDF files in the input directory.
+
+        Returns one result dict per file. A file that fails is reported with
+        status 'error' and does not stop the rest of the batch.
+
+        progress is called as progress(event, data) with the events 'batch',
+        'file_started', 'page_done' and 'file_done'. should_cancel is polled
+        between files and pages; once it returns True the remaining files are
+        reported with status 'cancelled'.
+        """
         logger.info("PDF Processor er startet!")
         
         # Ensure output directory exists
         os.makedirs(self.output_dir, exist_ok=True)
         
-        # Process each PDF file in the input directory
-        for filename in os.listdir(self.input_dir):
+        # Collect each PDF file in the input directory
+        tasks = []
+        for filename in sorted(os.listdir(self.input_dir)):
             if filename.endswith('.pdf'):
                 input_path = os.path.join(self.input_dir, filename)
                 output_path = os.path.join(self.output_dir, f'Prosessert_{filename}')
-                self.process_single_file(input_path, output_path)
-                
-    def process_single_file(self, input_path, output_path):
-        """Process a single PDF file to remove prices, totals, kampanje sections, and MVA summary."""
-        try:
-            # Open the PDF
-            pdf_document = fitz.open(input_path)
-            
-            # Process each page
-            for page in pdf_document:
-                # Get all text instances
-                text_instances = page.get_text("words")
-                
-                # Find column positions and kampanje sections
-                columns = self._find_columns(text_instances)
-                kampanje_sections = self._find_kampanje_sections(text_instances)
-                mva_sections = self._find_mva_sections(text_instances)
-                
-                if not columns and not kampanje_sections and not mva_sections:
-                    logger.warning("No columns, kampanje sections, or MVA sections found on page")
+                tasks.append((input_path, output_path))
+        
+        return self.process_paths(tasks, progress, should_cancel)
+
+    def process_paths(self, tasks, progress=None, should_cancel=None):
+        """Process a list of (input_path, output_path) pairs.
+
+        Takes the same progress and should_cancel callbacks as process_files
+        and returns one result dict per pair, in the same order.
+        """
+        notify(progress, 'batch', {'files': [os.path.basename(input_path) for input_path, _ in tasks]})
+        
+        # Serve files that were processed before from the cache
+        results = {}
+        cache_keys = {}
+        seen_keys = set()
+        duplicates = []  # Same content as an earlier file in this batch
+        if self.cache is not None:
+            for input_path, output_path in tasks:
+                key = self._cache_key(input_path)
+                if key is None:
                     continue
+                if key in seen_keys:
+                    duplicates.append((input_path, output_path))
+                else:
+                    result = self._from_cache(input_path, output_path, key)
+                    if result is not None:
+                        results[input_path] = result
+                        notify(progress, 'file_done', result)
+                cache_keys[input_path] = key
+                seen_keys.add(key)
+        
+        duplicate_inputs = set(input_path for input_path, _ in duplicates)
+        todo = [task for task in tasks if task[0] not in results and task[0] not in duplicate_inputs]
+        results.update(self._run_tasks(todo, progress, should_cancel))
+        self._store_in_cache(todo, results, cache_keys)
+        
+        # Duplicates are linked to the entry stored for the first copy, or processed if that failed
+        for input_path, output_path in duplicates:
+            result = self._from_cache(input_path, output_path, cache_keys[input_path])
+            if result is not None:
+                results[input_path] = result
+                notify(progress, 'file_done', result)
+        todo = [task for task in duplicates if task[0] not in results]
+        results.update(self._run_tasks(todo, progress, should_cancel))
+        self._store_in_cache(todo, results, cache_keys)
+        
+        for input_path, _ in tasks:
+            result = results[input_path]
+            FILES_PROCESSED.inc(status='cached' if result['cached'] else result['status'])
+            if result['status'] == 'ok':
+                self.processed_files.add(result['output_path'])
+                if not result['cached']:
+                    PAGES_PROCESSED.inc(result['pages'])
+        
+        return [results[input_path] for input_path, _ in tasks]
+
+    def _run_tasks(self, tasks, progress=None, should_cancel=None):
+        """Process (input_path, output_path) tasks serially or in the process pool."""
+        results = {}
+        if self.workers and self.workers > 1 and tasks:
+            pool_results = process_in_pool(tasks, self.workers, self.split_pages, progress, should_cancel,
+                                           self.save_options, self.window_pages, self.memory_limit)
+            for (input_path, _), result in zip(tasks, pool_results):
+                results[input_path] = result
+        else:
+            for input_path, output_path in tasks:
+                if should_cancel and should_cancel():
+                    result = make_result(input_path, output_path, status='cancelled')
+                else:
+                    result = self._process_task(input_path, output_path, progress, should_cancel)
+                results[input_path] = result
+                notify(progress, 'file_done', result)
+        return results
+
+    def _cache_key(self, input_path):
+        try:
+            return self.cache.key(input_path)
+        except OSError as e:
+            logger.error(f"Could not hash {input_path} for cache lookup: {str(e)}")
+            return None
+
+    def _from_cache(self, input_path, output_path, key):
+        """Return a result for input_path if its output is in the cache, else None."""
+        meta = self.cache.get(key, output_path)
+        if meta is None:
+            return None
+        return make_result(input_path, output_path, pages=meta.get('pages', 0), cached=True)
+
+    def _store_in_cache(self, tasks, results, cache_keys):
+        for input_path, _ in tasks:
+            result = results[input_path]
+            if result['status'] == 'ok' and input_path in cache_keys:
+                self.cache.put(cache_keys[input_path], result['output_path'], pages=result['pages'])
+
+    def _process_task(self, input_path, output_path, progress=None, should_cancel=None):
+        """Process one file and turn the outcome into a result dict."""
+        try:
+            pages = self.process_single_file(input_path, output_path, progress, should_cancel)
+            return make_result(input_path, output_path, pages=pages)
+        except ProcessingCancelled:
+            return make_result(input_path, output_path, status='cancelled')
+        except Exception as e:
+            return make_result(input_path, output_path, error=e)
                 
-                # Group text by rows (using y-coordinates)
-                rows = {}
-                for inst in text_instances:
-                    y_coord = round(inst[1], 1)  # Round to 1 decimal to group nearby y-coordinates
-                    if y_coord not in rows:
-                        rows[y_coord] = []
-                    rows[y_coord].append(inst)
-                
-                # Process each row
-                for y_coord in sorted(rows.keys()):
-                    row_content = rows[y_coord]
-                    # Sort content by x-coordinate
-                    row_content.sort(key=lambda x: x[0])
-                    
-                    # Process each text instance in the row
-                    for inst in row_content:
-                        x_coord = inst[0]
-                        text = inst[4]
-                        
-                        should_remove = False
-                        
-                        # Check if this text is in Pris or Total columns and is a number
-                        if self._is_in_column(x_coord, columns['pris']) or self._is_in_column(x_coord, columns['total']):
-                            if self._is_number(text):
-                                should_remove = True
-                        
-                        # Check if this text is part of a kampanje section
-                        for section in kampanje_sections:
-                            if self._is_in_kampanje_section(inst, section):
-                                should_remove = True
-                                break
-                                
-                        # Check if this text is part of an MVA section
-                        for section in mva_sections:
-                            if self._is_in_mva_section(inst, section):
-                                should_remove = True
-                                break
-                        
-                        if should_remove:
-                            # Create a redaction annotation
-                            rect = fitz.Rect(inst[0], inst[1], inst[2], inst[3])
-                            annot = page.add_redact_annot(rect)
-                            # Apply the redaction
-                            page.apply_redactions()
-            
-            # Save the processed PDF
-            pdf_document.save(output_path)
-            pdf_document.close()
+    def process_single_file(self, input_path, output_path, progress=None, should_cancel=None):
+        """Process a single PDF file to remove prices, totals, kampanje sections, and MVA summary.
+
+        Returns the number of pages in the document. Raises ProcessingCancelled
+        if should_cancel returns True before the file is saved.
+        """
+        try:
+            with self._stage('file'):
+                # Open the PDF
+                with self._stage('open'):
+                    pdf_document = fitz.open(input_path)
+                if self.window_pages and pdf_document.page_count > self.window_pages:
+                    page_count = pdf_document.page_count
+                    pdf_document.close()
+                    page_count = self._process_in_windows(input_path, output_path, page_count, progress, should_cancel)
+                else:
+                    page_count = self._process_document(
+                        pdf_document, os.path.basename(input_path),
+                        lambda: self._save_document(pdf_document, output_path),
+                        progress, should_cancel
+                    )
             
             # Track the processed file
             self.processed_files.add(output_path)
+            return page_count
             
-            logger.info(f"Prosessert fil: {os.path.basename(input_path)}")
-            
+        except ProcessingCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error processing file {input_path}: {str(e)}")
             raise
 
-    def _find_kampanje_sections(self, text_instances):
-        """Find all kampanje sections in the document."""
-        kampanje_sections = []
+    def process_stream(self, source, target, name='stream', progress=None, should_cancel=None):
+        """Process a PDF read from source and write the result to target, without touching the disk.
+
+        source is bytes or a readable binary stream, target a writable binary
+        stream. Returns the number of pages in the document.
+        """
+        data = source if isinstance(source, (bytes, bytearray, memoryview)) else source.read()
+        try:
+            with self._stage('file'):
+                with self._stage('open'):
+                    pdf_document = fitz.open(stream=data, filetype='pdf')
+                page_count = self._process_document(
+                    pdf_document, name,
+                    lambda: pdf_document.save(target, **self.save_options),
+                    progress, should_cancel
+                )
+            FILES_PROCESSED.inc(status='ok')
+            PAGES_PROCESSED.inc(page_count)
+            return page_count
+            
+        except ProcessingCancelled:
+            FILES_PROCESSED.inc(status='cancelled')
+            raise
+        except Exception as e:
+            FILES_PROCESSED.inc(status='error')
+            logger.error(f"Error processing {name}: {str(e)}")
+            raise
+
+    def process_bytes(self, data, name='stream', progress=None, should_cancel=None):
+        """Process a PDF given as bytes or a readable stream and return the redacted PDF as bytes."""
+        buffer = io.BytesIO()
+        self.process_stream(data, buffer, name, progress, should_cancel)
+        return buffer.getvalue()
+
+    def _process_document(self, pdf_document, name, save, progress=None, should_cancel=None):
+        """Redact every page of an open document, call save() and close the document.
+
+        Returns the number of pages.
+        """
+        try:
+            page_count = pdf_document.page_count
+            skipped_before = self.pages_skipped
+            notify(progress, 'file_started', {'file': name, 'pages': page_count})
+            
+            def on_page(page_number):
+                notify(progress, 'page_done', {'file': name, 'page': page_number + 1, 'pages': page_count})
+            
+            try:
+                self._redact_document(pdf_document, on_page=on_page, should_cancel=should_cancel)
+            except ProcessingCancelled:
+                logger.info(f"Avbrutt: {name}")
+                raise
+            
+            # Save the processed PDF
+            with self._stage('save'):
+                clear_outline(pdf_document)
+                save()
+        finally:
+            pdf_document.close()
+        
+        self._log_processed(name, page_count, self.pages_skipped - skipped_before)
+        return page_count
+
+    def _log_processed(self, name, page_count, skipped):
+        if skipped:
+            logger.info(f"Prosessert fil: {name} ({skipped} av {page_count} sider uten treff hoppet over)")
+        else:
+            logger.info(f"Prosessert fil: {name}")
+
+    def _process_in_windows(self, input_path, output_path, page_count, progress=None, should_cancel=None):
+        """Process a large document window_pages pages at a time and join the windows into output_path.
+
+        The document is reopened for every window and each finished window is
+        saved to a part file, so only one window of redacted pages is held in
+        memory. The column layout is carried from window to window, which
+        gives the same pages as processing the whole document at once. A
+        checkpoint is written after every window; a later run over the same
+        input continues after the last saved window. Returns the number of pages.
+        """
+        name = os.path.basename(input_path)
+        checkpoint = WindowCheckpoint(input_path, output_path, page_count, rules_version(self))
+        start = checkpoint.load()
+        if start:
+            logger.info(f"Fortsetter {name} fra side {start + 1} av {page_count}")
+        layout = DocumentLayout.from_state(checkpoint.layout)
+        notify(progress, 'file_started', {'file': name, 'pages': page_count})
         
-        for inst in text_instances:
-            text = inst[4].strip().lower()
-            if text == "kampanje":
-                # When we find a kampanje header, create a section that includes
-                # the header and extends to the right of the page
-                section = {
-                    'x0': 0,  # Start from left edge
-                    'y0': inst[1] - 5,  # Slightly above the header
-                    'x1': inst[2] + 500,  # Extend well past the header
-                    'y1': inst[3] + 30,  # Extend below to catch any related content
-                }
-                kampanje_sections.append(section)
-                logger.info(f"Found Kampanje section at y={inst[1]}")
+        def on_page(page_number):
+            notify(progress, 'page_done', {'file': name, 'page': page_number + 1, 'pages': page_count})
         
-        return kampanje_sections
-    
-    def _is_in_kampanje_section(self, inst, section):
-        """Check if a text instance falls within a kampanje section."""
-        return (section['x0'] <= inst[0] and inst[2] <= section['x1'] and
-                section['y0'] <= inst[1] and inst[3] <= section['y1'])
-
-    def _find_columns(self, text_instances):
-        """Find the x-coordinates of each column."""
-        columns = {'pris': None, 'total': None}
-        header_y = None
+        try:
+            while start < page_count:
+                stop = min(start + self.window_pages, page_count)
+                start = self._process_window(input_path, checkpoint, start, stop, layout, on_page, should_cancel)
+            with self._stage('save'):
+                assemble_parts(checkpoint.part_paths(), output_path, self.save_options, source_path=input_path)
+        except ProcessingCancelled:
+            checkpoint.clear()
+            logger.info(f"Avbrutt: {name}")
+            raise
         
-        # First find headers and their y-position
-        for inst in text_instances:
-            text = inst[4].strip().lower()
-            if text == "pris" or text == "total":
-                header_y = inst[1]
-                if text == "pris":
-                    columns['pris'] = inst[0]
-                    logger.info(f"Found Pris column at x={inst[0]}")
-                else:
-                    columns['total'] = inst[0]
-                    logger.info(f"Found Total column at x={inst[0]}")
+        checkpoint.clear()
+        self._log_processed(f'{name} ({len(checkpoint.parts)} vinduer)', page_count, checkpoint.skipped)
+        return page_count
+
+    def _process_window(self, input_path, checkpoint, start, stop, layout, on_page=None, should_cancel=None):
+        """Redact pages [start, stop), save them as a part file and record it in the checkpoint.
+
+        The window ends early when the process goes above memory_limit. Returns
+        the first page after the window.
+        """
+        skipped_before = self.pages_skipped
+        pages = []
+        
+        def window():
+            for page_number in range(start, stop):
+                if pages and self._over_memory_limit():
+                    break
+                pages.append(page_number)
+                yield page_number
         
-        # If we found headers, adjust column positions based on content alignment
-        if header_y is not None:
-            # Look at content just below headers to fine-tune column positions
-            for inst in text_instances:
-                if inst[1] > header_y and inst[1] < header_y + 50:  # Look within 50 points below headers
-                    text = inst[4].strip()
-                    if self._is_number(text):
-                        # Check which column this number belongs to
-                        if columns['pris'] and abs(inst[0] - columns['pris']) < 30:
-                            columns['pris'] = inst[0]  # Update to align with actual content
-                        elif columns['total'] and abs(inst[0] - columns['total']) < 30:
-                            columns['total'] = inst[0]  # Update to align with actual content
+        with self._stage('open'):
+            pdf_document = fitz.open(input_path)
+        try:
+            self._redact_document(pdf_document, window(), on_page, should_cancel, layout)
+            with self._stage('save'):
+                pdf_document.select(pages)
+                pdf_document.save(checkpoint.part_path(start), garbage=1)
+        finally:
+            pdf_document.close()
         
-        return columns
-    
-    def _is_in_column(self, x_coord, column_x):
-        """Check if an x-coordinate falls within a column's range."""
-        if column_x is None:
+        # Drop fonts, images and other resources MuPDF cached for the window
+        fitz.TOOLS.store_shrink(100)
+        checkpoint.save(start, pages[-1] + 1, layout.state(), self.pages_skipped - skipped_before)
+        WINDOWS_FLUSHED.inc()
+        return pages[-1] + 1
+
+    def _over_memory_limit(self):
+        """True when resident memory is above memory_limit even after emptying MuPDF's store."""
+        if not self.memory_limit:
+            return False
+        resident = resident_bytes()
+        if resident is None or resident <= self.memory_limit:
             return False
-        return abs(x_coord - column_x) < 30  # Increased tolerance slightly
+        fitz.TOOLS.store_shrink(100)
+        resident = resident_bytes()
+        return resident is not None and resident > self.memory_limit
+
+    def process_page_range(self, input_path, output_path, start, stop):
+        """Process pages [start, stop) of a PDF and save only those pages to output_path."""
+        try:
+            with self._stage('open'):
+                pdf_document = fitz.open(input_path)
+            pages = range(start, min(stop, pdf_document.page_count))
             
-    def _is_number(self, text):
-        """Check if the text represents a number (with or without thousand separator and currency suffix)."""
-        # Remove any trailing spaces
-        text = text.strip()
-        
-        # Remove currency suffix if present
-        text = text.rstrip(",-").rstrip("-")
+            self._redact_document(pdf_document, pages, layout=self._layout_before(pdf_document, pages))
+            
+            with self._stage('save'):
+                pdf_document.select(list(pages))
+                self._save_document(pdf_document, output_path)
+                pdf_document.close()
+            return len(pages)
+            
+        except Exception as e:
+            logger.error(f"Error processing pages {start}-{stop} of {input_path}: {str(e)}")
+            raise
+
+    def _stage(self, name):
+        """Time a block as a metrics span and add it to stage_times[name]."""
+        return span(name, self.stage_times)
+
+    def _save_document(self, pdf_document, output_path):
+        """Save to a temporary file and move it into place.
+
+        Replacing the file instead of overwriting it keeps hard links to an
+        earlier output (such as cache entries) intact.
+        """
+        tmp_path = f'{output_path}.tmp'
+        pdf_document.save(tmp_path, **self.save_options)
+        os.replace(tmp_path, output_path)
+
+    def _redact_document(self, pdf_document, pages=None, on_page=None, should_cancel=None, layout=None):
+        """Redact the given page numbers (default: all pages) of an open document.
+
+        layout carries column geometry into the first page; by default the
+        document starts without any.
+        """
+        if pages is None:
+            pages = range(pdf_document.page_count)
+        if layout is None:
+            layout = DocumentLayout()
+        carried_before = layout.carried_pages
         
-        # Remove all spaces (thousand separators)
-        text = text.replace(" ", "")
+        # Process each page
+        for page_number in pages:
+            if should_cancel and should_cancel():
+                raise ProcessingCancelled()
+            
+            with self._stage('page'):
+                page = pdf_document[page_number]
+                
+                # Collect every rectangle to redact, then apply them in one pass
+                _, rects = self._page_redactions(page, layout)
+                if rects:
+                    with self._stage('redact'):
+                        redact_page(page, rects)
+            REDACTIONS_PER_PAGE.observe(len(rects))
+            
+            if on_page:
+                on_page(page_number)
         
-        # Check if what remains is a number
-        return text.isdigit()
+        carried = layout.carried_pages - carried_before
+        self.pages_carried += carried
+        PAGES_CARRIED.inc(carried)
 
-    def _is_price(self, text):
-        """Deprecated: Use _is_number instead."""
-        return self._is_number(text)
+    def _layout_before(self, pdf_document, pages):
+        """Layout carried into the first of pages, as a run over the whole document would have it.
+
+        For every page size in pages the columns come from the nearest earlier
+        page of that size with a header row, so a page range processed on its
+        own redacts continuation pages the same way as the whole document.
+        """
+        layout = DocumentLayout()
+        if not pages:
+            return layout
+        sizes = {DocumentLayout.size_of(pdf_document[page_number].rect) for page_number in pages}
+        for page_number in range(pages[0] - 1, -1, -1):
+            if sizes <= layout.templates.keys():
+                break
+            page = pdf_document[page_number]
+            layout.start_page(page.rect)
+            if layout.page_size not in sizes or layout.page_size in layout.templates:
+                continue
+            textpage = page.get_textpage(flags=TEXT_FLAGS)
+            if not has_header_text(textpage.extractText()):
+                continue
+            analysis = PageAnalysis(page.get_text("words", textpage=textpage))
+            if analysis.has_header:
+                layout.update(analysis)
+        return layout
 
-    def _find_mva_sections(self, text_instances):
-        """Find all MVA summary sections in the document."""
-        mva_sections = []
+    def _page_redactions(self, page, layout):
+        """Return the words of a page and the rectangles that should be redacted on it.
+
+        The page text is extracted once. Pages whose plain text shows they
+        cannot contain anything to redact are skipped before the words are
+        built and analysed; for those both lists are empty. Pages that could
+        only continue a price table from an earlier page are skipped unless
+        their words have a row of numbers in the carried columns. layout is
+        the DocumentLayout of the pages before this one and is updated with it.
+        """
+        layout.start_page(page.rect)
+        carried = layout.carried_columns()
+        with self._stage('extract'):
+            textpage = page.get_textpage(flags=TEXT_FLAGS)
         
-        # Group text instances by their y-coordinate (same line)
-        rows = {}
-        for inst in text_instances:
-            y_coord = round(inst[1], 1)
-            if y_coord not in rows:
-                rows[y_coord] = []
-            rows[y_coord].append(inst)
+        with self._stage('triage'):
+            text = textpage.extractText()
+            candidate = may_have_targets(text, carried is not None)
+            continuation_only = candidate and carried is not None and not has_target_keywords(text)
+        if not candidate:
+            return self._skip_page()
         
-        # Look for MVA-related content in each row
-        for y_coord, row_content in rows.items():
-            # Sort content by x-coordinate
-            row_content.sort(key=lambda x: x[0])
-            row_text = ' '.join(inst[4].lower() for inst in row_content)
-            
-            # Check for MVA-related patterns
-            if ('herav mva' in row_text or 
-                'mva' in row_text and '%' in row_text or 
-                'totalbeløp uten mva' in row_text or
-                'gjennomsnittlig' in row_text):
-                
-                # Create a section that covers the entire row
-                if row_content:
-                    section = {
-                        'x0': 0,  # Start from left edge
-                        'y0': min(inst[1] for inst in row_content) - 2,  # Slightly above
-                        'x1': max(inst[2] for inst in row_content) + 500,  # Extend past the content
-                        'y1': max(inst[3] for inst in row_content) + 2,  # Slightly below
-                    }
-                    mva_sections.append(section)
-                    logger.info(f"Found MVA section at y={y_coord}")
+        # Get all text instances
+        with self._stage('extract'):
+            text_instances = page.get_text("words", textpage=textpage)
+        
+        if continuation_only:
+            with self._stage('triage'):
+                numbers = [(word[0], word[1]) for word in text_instances if is_number(word[4])]
+                candidate = has_price_row(numbers, carried)
+            if not candidate:
+                return self._skip_page()
         
-        return mva_sections
-    
-    def _is_in_mva_section(self, inst, section):
-        """Check if a text instance falls within an MVA section."""
-        return (section['x0'] <= inst[0] and inst[2] <= section['x1'] and
-                section['y0'] <= inst[1] and inst[3] <= section['y1'])
+        with self._stage('detect'):
+            rects = self._collect_redaction_rects(text_instances, layout)
+        if rects is None:
+            logger.debug("No columns, kampanje sections, or MVA sections found on page")
+            return text_instances, []
+        return text_instances, rects
+
+    def _skip_page(self):
+        self.pages_skipped += 1
+        PAGES_SKIPPED.inc()
+        return [], []
+
+    def find_redactions(self, input_path):
+        """Report what would be redacted in a PDF without changing anything.
+
+        Returns a list with one dict per page that has redactions, holding the
+        1-based page number, the rectangles and the words they cover.
+        """
+        pages = []
+        with fitz.open(input_path) as pdf_document:
+            layout = DocumentLayout()
+            for page in pdf_document:
+                text_instances, rects = self._page_redactions(page, layout)
+                if not rects:
+                    continue
+                texts = {tuple(inst[:4]): inst[4] for inst in text_instances}
+                pages.append({
+                    'page': page.number + 1,
+                    'rects': rects,
+                    'texts': [texts.get(tuple(rect), '') for rect in rects],
+                })
+        return pages
+
+    def _collect_redaction_rects(self, text_instances, layout=None):
+        """Collect the rectangles of all words on a page that should be redacted.
+
+        With a DocumentLayout, pages without a header row can use the columns
+        of an earlier page. Returns None when the page has no columns,
+        kampanje or MVA sections.
+        """
+        analysis = PageAnalysis(text_instances, layout.carried_columns() if layout is not None else None)
+        if layout is not None:
+            layout.update(analysis)
+        if not analysis.has_targets:
+            return None
+        return analysis.redaction_rects()
+
+    def _is_number(self, text):
+        """Check if the text represents a number (with or without thousand separator and currency suffix)."""
+        return is_number(text)
+
+    def _is_price(self, text):
+        """Deprecated: Use _is_number instead."""
+        return self._is_number(text)
 
     def cleanup(self):
         """Remove all processed files and input files."""
@@ -262,4 +593,5 @@ class PDFProcessor:
             self.processed_files.clear()
             
         except Exception as e:
-            logger.error(f"Error during cleanup: {str(e)}") 
\ No newline at end of file
+            logger.error(f"Error during cleanup: {str(e)}")
+
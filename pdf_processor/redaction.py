@@ -0,0 +1,52 @@
+import fitz  # PyMuPDF
+
+
+def merge_rects(rects, line_tolerance=0.5, gap=0.0):
+    """Merge overlapping or touching rectangles that sit on the same text line.
+
+    Only rectangles with (almost) the same vertical extent are merged, so the
+    merged rectangle never covers area that none of the originals covered.
+    """
+    if not rects:
+        return []
+
+    ordered = sorted(rects, key=lambda r: (round(r[1], 1), r[0]))
+    merged = [list(ordered[0][:4])]
+    for rect in ordered[1:]:
+        last = merged[-1]
+        same_line = (abs(rect[1] - last[1]) <= line_tolerance and
+                     abs(rect[3] - last[3]) <= line_tolerance)
+        if same_line and rect[0] <= last[2] + gap:
+            last[0] = min(last[0], rect[0])
+            last[1] = min(last[1], rect[1])
+            last[2] = max(last[2], rect[2])
+            last[3] = max(last[3], rect[3])
+        else:
+            merged.append(list(rect[:4]))
+
+    return [fitz.Rect(r) for r in merged]
+
+
+def redact_page(page, rects):
+    """Add one redaction annotation per (merged) rectangle and apply them in a single pass.
+
+    Returns the number of redaction annotations applied to the page.
+    """
+    merged = merge_rects(rects)
+    if not merged:
+        return 0
+
+    for rect in merged:
+        page.add_redact_annot(rect)
+    page.apply_redactions()
+    return len(merged)
+
+
+def clear_outline(pdf_document):
+    """Remove the outline (bookmarks) of a document.
+
+    Offers made with wkhtmltopdf get an outline entry for every table cell,
+    so the outline repeats the prices that are redacted from the pages.
+    """
+    if pdf_document.get_toc():
+        pdf_document.set_toc([])
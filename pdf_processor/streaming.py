@@ -0,0 +1,91 @@
+import io
+import os
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when a streamed upload is larger than the allowed size."""
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable stream that hands written bytes back in chunks."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(files, compression=zipfile.ZIP_DEFLATED, store_pdfs=True, chunk_size=CHUNK_SIZE):
+    """Yield a ZIP archive of (arcname, path) pairs chunk by chunk.
+
+    Only one chunk of each file is held in memory at a time. With store_pdfs,
+    PDFs are added uncompressed (ZIP_STORED) since they are compressed already.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression) as zf:
+        for arcname, path in files:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = zipfile.ZIP_STORED if store_pdfs and arcname.lower().endswith('.pdf') else compression
+            with open(path, 'rb') as src, zf.open(info, 'w', force_zip64=True) as dest:
+                for chunk in iter(lambda: src.read(chunk_size), b''):
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def read_stream(stream, max_bytes=None, chunk_size=CHUNK_SIZE):
+    """Read a binary stream into bytes, raising UploadTooLarge as soon as it passes max_bytes."""
+    chunks = []
+    read = 0
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        read += len(chunk)
+        if max_bytes is not None and read > max_bytes:
+            raise UploadTooLarge(f'Upload larger than {max_bytes} bytes')
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def save_stream(stream, path, max_bytes=None, chunk_size=CHUNK_SIZE):
+    """Write a binary stream to path chunk by chunk and return the number of bytes written.
+
+    The data goes to a temporary file first, so a failed or too large upload
+    never leaves a partial file at path.
+    """
+    tmp_path = f'{path}.part'
+    written = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                written += len(chunk)
+                if max_bytes is not None and written > max_bytes:
+                    raise UploadTooLarge(f'Upload larger than {max_bytes} bytes')
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
@@ -0,0 +1,195 @@
+import os
+import time
+import signal
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .batch import MANIFEST_NAME, Manifest
+from .metrics import FILES_PROCESSED, PAGES_PROCESSED
+from .parallel import _process_file_worker, pool_context
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_PREFIX = 'Prosessert_'
+MAX_CRASHES = 3  # Times a file may be in flight when a worker dies before it is given up
+
+
+def _ignore_interrupt():
+    """Leave Ctrl+C to the watching process; it stops the pool itself."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class FolderWatcher:
+    """Process PDFs as they land in input_dir and write them to output_dir.
+
+    input_dir is polled every interval seconds with os.scandir. A file is
+    picked up once its size and modification time have not changed for
+    settle seconds, so files that are still being written are left alone.
+    Files named like an output (Prosessert_*) are never picked up, and
+    output_dir may not be input_dir.
+    Files are processed in a pool of worker processes, and every finished
+    file is recorded in the manifest in output_dir. After a restart only
+    new or changed files are processed. If a worker dies the pool is
+    replaced and the files it had in flight are tried again.
+    """
+
+    def __init__(self, input_dir, output_dir, workers=1, interval=1.0, settle=2.0, save_options=None,
+                 window_pages=None, memory_limit=None):
+        if os.path.realpath(output_dir) == os.path.realpath(input_dir):
+            raise ValueError('The output folder cannot be the folder that is watched')
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.workers = max(1, workers)
+        self.interval = interval
+        self.settle = settle
+        self.save_options = save_options
+        self.window_pages = window_pages
+        self.memory_limit = memory_limit
+        os.makedirs(output_dir, exist_ok=True)
+        self.manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME))
+        self._seen = {}  # input path -> (signature, time the signature was first seen)
+        self._running = {}  # input path -> signature being processed
+        self._failed = {}  # input path -> signature that failed, not retried until the file changes
+        self._crashes = {}  # input path -> (signature, times a worker died while it was in flight)
+        self._pool_broken = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pool = None
+
+    def _candidates(self):
+        """(input_path, signature) of the PDFs in input_dir, without hidden and partial files."""
+        try:
+            entries = list(os.scandir(self.input_dir))
+        except FileNotFoundError:
+            return []
+        candidates = []
+        for entry in entries:
+            if entry.name.startswith(('.', '~', OUTPUT_PREFIX)) or not entry.name.lower().endswith('.pdf'):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue  # Removed while scanning
+            candidates.append((entry.path, Manifest.signature(stat)))
+        return candidates
+
+    def output_path(self, input_path):
+        return os.path.join(self.output_dir, f'{OUTPUT_PREFIX}{os.path.basename(input_path)}')
+
+    def ready_files(self, now=None):
+        """Scan input_dir once and return the files that are complete and still to be processed."""
+        now = time.monotonic() if now is None else now
+        ready = []
+        present = set()
+        for input_path, signature in self._candidates():
+            present.add(input_path)
+            seen = self._seen.get(input_path)
+            if seen is None or seen[0] != signature:
+                self._seen[input_path] = (signature, now)
+                continue
+            if now - seen[1] < self.settle or signature[0] == 0:
+                continue
+            with self._lock:
+                if input_path in self._running or self._failed.get(input_path) == signature:
+                    continue
+            if self.manifest.is_done(input_path, self.output_path(input_path)):
+                continue
+            ready.append((input_path, signature))
+
+        # Forget files that were removed
+        for input_path in set(self._seen) - present:
+            del self._seen[input_path]
+        return ready
+
+    def scan_once(self):
+        """Submit every file that is ready and not yet processed. Returns how many were submitted."""
+        submitted = 0
+        for input_path, signature in self.ready_files():
+            with self._lock:
+                if len(self._running) >= self.workers * 2:
+                    break  # Keep the queue short; the rest is picked up on a later scan
+                self._running[input_path] = signature
+            output_path = self.output_path(input_path)
+            try:
+                future = self._pool.submit(_process_file_worker, input_path, output_path, self.save_options,
+                                           self.window_pages, self.memory_limit)
+            except Exception:
+                with self._lock:
+                    self._running.pop(input_path, None)
+                raise
+            future.add_done_callback(
+                lambda future, input_path=input_path, signature=signature, start=time.monotonic():
+                    self._finished(future, input_path, signature, start)
+            )
+            submitted += 1
+            logger.info(f"Ny fil i mappen: {os.path.basename(input_path)}")
+        return submitted
+
+    def _finished(self, future, input_path, signature, start):
+        output_path = self.output_path(input_path)
+        try:
+            pages = future.result()
+            # The signature seen before processing, so a file replaced meanwhile is processed again
+            self.manifest.record(input_path, output_path, signature=signature, pages=pages)
+            FILES_PROCESSED.inc(status='ok')
+            PAGES_PROCESSED.inc(pages)
+            logger.info(f"Prosessert fil: {os.path.basename(input_path)} på {time.monotonic() - start:.1f} s")
+        except BrokenProcessPool:
+            # A worker died; any file in flight may have caused it, so each gets a few more tries
+            with self._lock:
+                self._pool_broken = True
+                crashed, count = self._crashes.get(input_path, (None, 0))
+                count = count + 1 if crashed == signature else 1
+                self._crashes[input_path] = (signature, count)
+                if count >= MAX_CRASHES:
+                    self._failed[input_path] = signature
+            if count >= MAX_CRASHES:
+                FILES_PROCESSED.inc(status='error')
+                logger.error(f"Gir opp {input_path}: en prosess døde {count} ganger mens filen ble prosessert")
+            else:
+                logger.error(f"Prosessen døde mens {input_path} ble prosessert, prøver igjen")
+        except Exception as e:
+            FILES_PROCESSED.inc(status='error')
+            logger.error(f"Error processing file {input_path}: {str(e)}")
+            with self._lock:
+                self._failed[input_path] = signature
+        finally:
+            with self._lock:
+                self._running.pop(input_path, None)
+
+    def run(self):
+        """Watch input_dir until stop() is called."""
+        logger.info(f"Overvåker {self.input_dir} (hvert {self.interval} s, {self.workers} prosesser)")
+        self._pool = self._new_pool()
+        try:
+            while not self._stop.is_set():
+                if self._pool_broken:
+                    self._restart_pool()
+                try:
+                    self.scan_once()
+                except BrokenProcessPool:
+                    self._pool_broken = True
+                except Exception as e:
+                    logger.error(f"Error scanning {self.input_dir}: {str(e)}")
+                self._stop.wait(self.interval)
+        finally:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context(), initializer=_ignore_interrupt)
+
+    def _restart_pool(self):
+        """Replace a pool that is no longer usable because a worker died."""
+        logger.error("En prosess døde, starter prosessene på nytt")
+        self._pool.shutdown(wait=False)
+        with self._lock:
+            self._pool_broken = False
+        self._pool = self._new_pool()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,82 @@
+import os
+import json
+import shutil
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'checkpoint.json'
+
+
+def resident_bytes():
+    """Resident set size of this process in bytes, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class WindowCheckpoint:
+    """Part files and progress of a document processed in page windows.
+
+    The parts live in a hidden directory next to the output. After every
+    window the finished page ranges and the column layout are written to
+    checkpoint.json, so a run that crashed continues after the last window
+    that was saved. A checkpoint only counts for the same input file (size
+    and modification time), page count and rules version.
+    """
+
+    def __init__(self, input_path, output_path, page_count, version):
+        self.parts_dir = os.path.join(os.path.dirname(output_path), f'.{os.path.basename(output_path)}.parts')
+        self.path = os.path.join(self.parts_dir, CHECKPOINT_NAME)
+        stat = os.stat(input_path)
+        self.source = {
+            'input': os.path.abspath(input_path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'pages': page_count,
+            'version': version,
+        }
+        self.parts = []  # [start, stop] of the saved windows, in order
+        self.layout = []  # DocumentLayout.state() after the last saved window
+        self.skipped = 0  # Pages skipped by triage in the saved windows
+
+    def load(self):
+        """Pick up the saved windows of an earlier run. Returns the first page still to process."""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+        if state is None or state.get('source') != self.source or \
+                not all(os.path.exists(self.part_path(start)) for start, _ in state['parts']):
+            self.clear()
+            os.makedirs(self.parts_dir, exist_ok=True)
+            return 0
+        self.parts = state['parts']
+        self.layout = state['layout']
+        self.skipped = state['skipped']
+        return self.parts[-1][1] if self.parts else 0
+
+    def part_path(self, start):
+        return os.path.join(self.parts_dir, f'{start:06d}.pdf')
+
+    def part_paths(self):
+        return [self.part_path(start) for start, _ in self.parts]
+
+    def save(self, start, stop, layout, skipped):
+        """Record a window whose part file has been written."""
+        self.parts.append([start, stop])
+        self.layout = layout
+        self.skipped += skipped
+        state = {'source': self.source, 'parts': self.parts, 'layout': self.layout, 'skipped': self.skipped}
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
@@ -0,0 +1,135 @@
+import os
+import re
+import time
+import uuid
+import shutil
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class Workspace:
+    """Input and output directories that belong to one session."""
+
+    def __init__(self, workspace_id, root, processor):
+        self.id = workspace_id
+        self.root = root
+        self.input_dir = os.path.join(root, 'input')
+        self.output_dir = os.path.join(root, 'output')
+        self.processor = processor
+
+    def touch(self):
+        """Mark the workspace as in use; the directory mtime is what the reaper looks at."""
+        try:
+            os.utime(self.root)
+        except OSError:
+            pass
+
+
+class WorkspaceManager:
+    """Creates per-session workspaces under root and removes idle ones after ttl seconds.
+
+    processor_factory(input_dir, output_dir) creates the PDFProcessor of a
+    new workspace. is_busy(workspace_id), if given, keeps workspaces with
+    running work from being reaped.
+    """
+
+    def __init__(self, root, processor_factory, ttl=3600, is_busy=None):
+        self.root = root
+        self.ttl = ttl
+        self.processor_factory = processor_factory
+        self.is_busy = is_busy
+        self._workspaces = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def valid_id(workspace_id):
+        return bool(workspace_id) and WORKSPACE_ID.match(workspace_id) is not None
+
+    def get(self, workspace_id):
+        """Return the workspace for workspace_id, creating its directories if needed."""
+        if not self.valid_id(workspace_id):
+            raise ValueError(f'Invalid workspace id: {workspace_id!r}')
+        return self._get(workspace_id, create=True)
+
+    def find(self, workspace_id):
+        """Return the workspace for workspace_id if its directory exists, else None.
+
+        Never creates a directory, so requests that only read a workspace
+        cannot fill the disk with empty ones.
+        """
+        if not self.valid_id(workspace_id):
+            return None
+        return self._get(workspace_id, create=False)
+
+    def _get(self, workspace_id, create):
+        with self._lock:
+            workspace = self._workspaces.get(workspace_id)
+            root = os.path.join(self.root, workspace_id)
+            if not create and not os.path.isdir(root):
+                # Removed by another process's reaper, or never created
+                self._workspaces.pop(workspace_id, None)
+                return None
+            if workspace is None:
+                processor = self.processor_factory(os.path.join(root, 'input'), os.path.join(root, 'output'))
+                workspace = Workspace(workspace_id, root, processor)
+                os.makedirs(workspace.input_dir, exist_ok=True)
+                os.makedirs(workspace.output_dir, exist_ok=True)
+                self._workspaces[workspace_id] = workspace
+            # Touched under the lock, so reap() cannot remove it between this and the caller's use
+            workspace.touch()
+        return workspace
+
+    def _idle(self, workspace_id, path, cutoff):
+        try:
+            if os.path.getmtime(path) > cutoff:
+                return False
+        except OSError:
+            return False
+        return not (self.is_busy and self.is_busy(workspace_id))
+
+    def reap(self):
+        """Remove workspaces that have not been used for ttl seconds. Returns how many were removed."""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for workspace_id in os.listdir(self.root):
+            path = os.path.join(self.root, workspace_id)
+            if not self.valid_id(workspace_id) or not os.path.isdir(path):
+                continue
+            if not self._idle(workspace_id, path, cutoff):
+                continue
+
+            with self._lock:
+                # Check again: a request may have fetched the workspace since
+                if not self._idle(workspace_id, path, cutoff):
+                    continue
+                self._workspaces.pop(workspace_id, None)
+                shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+            logger.info(f"Ryddet opp arbeidsområde: {workspace_id}")
+        return removed
+
+    def start_reaper(self, interval=60):
+        """Run reap() every interval seconds on a daemon thread."""
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.reap()
+                except Exception as e:
+                    logger.error(f"Error during workspace cleanup: {str(e)}")
+
+        thread = threading.Thread(target=run, name='workspace-reaper', daemon=True)
+        thread.start()
+        return thread
+
+    def stop_reaper(self):
+        self._stop.set()
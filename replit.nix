@@ -4,5 +4,6 @@
         pkgs.python39Packages.flask
         pkgs.python39Packages.werkzeug
         pkgs.python39Packages.pymupdf
+        pkgs.python39Packages.gunicorn
     ];
 } 
\ No newline at end of file
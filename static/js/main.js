@@ -26,27 +26,26 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
-        const formData = new FormData();
-        for (let i = 0; i < files.length; i++) {
-            formData.append('files', files[i]);
-        }
-
         try {
-            const response = await fetch('/upload', {
-                method: 'POST',
-                body: formData
-            });
-
-            const data = await response.json();
+            // Send each file as a raw body so the server can write it straight to disk
+            for (let i = 0; i < files.length; i++) {
+                const response = await fetch(`/upload-stream/${encodeURIComponent(files[i].name)}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/pdf' },
+                    body: files[i]
+                });
 
-            if (response.ok) {
-                showStatus(uploadStatus, data.message, 'success');
-                fileInput.value = '';
-                selectedFiles.innerHTML = '';
-                loadFiles();
-            } else {
-                showStatus(uploadStatus, data.error, 'error');
+                if (!response.ok) {
+                    const data = await response.json();
+                    showStatus(uploadStatus, data.error, 'error');
+                    return;
+                }
             }
+
+            showStatus(uploadStatus, `${files.length} fil(er) lastet opp`, 'success');
+            fileInput.value = '';
+            selectedFiles.innerHTML = '';
+            loadFiles();
         } catch (error) {
             showStatus(uploadStatus, 'Feil ved opplasting av filer', 'error');
         }
@@ -63,7 +62,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
             if (response.ok) {
                 showStatus(processStatus, data.message, 'success');
-                loadFiles();
+                processBtn.disabled = true;
+                pollJob(data.status_url);
             } else {
                 showStatus(processStatus, data.error, 'error');
             }
@@ -72,27 +72,44 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
-    // Handle download all files
-    downloadAllBtn.addEventListener('click', async () => {
+    // Poll a processing job until it is finished
+    async function pollJob(statusUrl) {
         try {
-            const response = await fetch('/download-all');
-            if (response.ok) {
-                const blob = await response.blob();
-                const url = window.URL.createObjectURL(blob);
-                const a = document.createElement('a');
-                a.href = url;
-                a.download = 'processed_files.zip';
-                document.body.appendChild(a);
-                a.click();
-                window.URL.revokeObjectURL(url);
-                document.body.removeChild(a);
+            const response = await fetch(statusUrl);
+            const job = await response.json();
+
+            if (!response.ok) {
+                showStatus(processStatus, job.error, 'error');
+                processBtn.disabled = false;
+                return;
+            }
+
+            if (job.status === 'queued' || job.status === 'running') {
+                showStatus(processStatus, `Behandler filer (${job.files_done}/${job.files_total})`, 'success');
+                setTimeout(() => pollJob(statusUrl), 1000);
+                return;
+            }
+
+            processBtn.disabled = false;
+            if (job.status === 'done' && job.errors.length === 0) {
+                showStatus(processStatus, 'Filer behandlet', 'success');
+            } else if (job.status === 'done') {
+                showStatus(processStatus, `Filer behandlet, ${job.errors.length} feilet`, 'error');
+            } else if (job.status === 'cancelled') {
+                showStatus(processStatus, 'Behandling avbrutt', 'error');
             } else {
-                const data = await response.json();
-                showStatus(processStatus, data.error, 'error');
+                showStatus(processStatus, 'Feil ved prosessering av filer', 'error');
             }
+            loadFiles();
         } catch (error) {
-            showStatus(processStatus, 'Feil ved nedlasting av filer', 'error');
+            processBtn.disabled = false;
+            showStatus(processStatus, 'Feil ved prosessering av filer', 'error');
         }
+    }
+
+    // Handle download all files; navigating lets the browser stream the ZIP straight to disk
+    downloadAllBtn.addEventListener('click', () => {
+        window.location.href = '/download-all';
     });
 
     // Load and display processed files
@@ -107,9 +124,13 @@ document.addEventListener('DOMContentLoaded', () => {
                     const fileItem = document.createElement('div');
                     fileItem.className = 'file-item';
                     fileItem.innerHTML = `
-                        <span>${file}</span>
+                        <a href="/preview/${file}/1?dpi=100" target="_blank" class="preview-link">
+                            <img src="/preview/${file}/1" class="preview-thumb" loading="lazy" alt="Forhåndsvisning av ${file}">
+                        </a>
+                        <span class="file-name">${file}</span>
                         <a href="/download/${file}" class="download-btn">Last ned</a>
                     `;
+                    retryThumbnail(fileItem.querySelector('.preview-thumb'), 3);
                     filesList.appendChild(fileItem);
                 });
                 
@@ -121,6 +142,15 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // Try a thumbnail again later if the server was busy rendering
+    function retryThumbnail(img, attempts) {
+        img.addEventListener('error', () => {
+            if (attempts-- > 0) {
+                setTimeout(() => { img.src = `${img.src.split('?')[0]}?retry=${attempts}`; }, 2000);
+            }
+        });
+    }
+
     // Update selected files list
     function updateSelectedFilesList() {
         selectedFiles.innerHTML = '';